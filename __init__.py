@@ -1,13 +1,16 @@
 import importlib
-from logging import getLogger, StreamHandler, Formatter, handlers, DEBUG, INFO
+from logging import getLogger
 import sys
-import os
-import datetime
 
-# import bpy
+import bpy
 
+# 有効にするときに登録するモジュール 軽いものだけ
 module_names = [
+    "preferences",
     "translations",
+]
+# 起動が終わってから読み込んで登録するモジュール オペレーターとメニュー
+deferred_module_names = [
     "tategaki",
 ]
 
@@ -26,62 +29,57 @@ bl_info = {
 }
 
 
-LOGLEVEL = DEBUG
-# LOGLEVEL = INFO
-
-
-def setup_logger(log_folder: str, modname=__name__):
-    """loggerの設定をする"""
-    logger = getLogger(modname)
-    logger.setLevel(LOGLEVEL)
-    # log重複回避　https://nigimitama.hatenablog.jp/entry/2021/01/27/084458
-    if not logger.hasHandlers():
-        sh = StreamHandler()
-        sh.setLevel(LOGLEVEL)
-        formatter = Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        sh.setFormatter(formatter)
-        logger.addHandler(sh)
-        fh = handlers.RotatingFileHandler(log_folder, maxBytes=500000, backupCount=2)
-        fh.setLevel(LOGLEVEL)
-        fh_formatter = Formatter(
-            "%(asctime)s - %(filename)s - %(name)s"
-            " - %(lineno)d - %(levelname)s - %(message)s"
-        )
-        fh.setFormatter(fh_formatter)
-        logger.addHandler(fh)
-    return logger
-
-
-# log周りの設定
-scripts_dir = os.path.dirname(os.path.abspath(__file__))
-log_folder = os.path.join(scripts_dir, "log", f"{datetime.date.today()}.log")
-logger = setup_logger(log_folder, modname=__name__)
-logger.debug("hello")
-
-
-# サブモジュールのインポート
-namespace = {}
-for name in module_names:
+# ログのレベルと書き出し先はアドオンの設定で決める(lib/preferences.py)
+logger = getLogger(__name__)
+
+
+def import_module(name: str):
+    """サブモジュールを読み込む 読み込み済みならリロードする"""
     fullname = "{}.{}.{}".format(__package__, "lib", name)
-    # if "bpy" in locals():
     if fullname in sys.modules:
-        namespace[name] = importlib.reload(sys.modules[fullname])
-    else:
-        namespace[name] = importlib.import_module(fullname)
-logger.debug(namespace)
+        return importlib.reload(sys.modules[fullname])
+    return importlib.import_module(fullname)
+
+
+# サブモジュールのインポート 後回しにするモジュールは登録するときに読み込む
+namespace = {}
+for name in module_names:
+    namespace[name] = import_module(name)
+
+
+def register_deferred():
+    """
+    後回しにしたモジュールを読み込んで登録する
+    タイマーから呼ぶのでNoneを返して1回で終わる
+    """
+    for name in deferred_module_names:
+        if name not in namespace:
+            namespace[name] = import_module(name)
+        namespace[name].register()
+    logger.info("registered %s:version%s", bl_info["name"], bl_info["version"])
+    return None
 
 
 def register():
-    print(__name__)
-    for module in namespace.values():
-        module.register()
-    logger.info(f"registered {bl_info['name']}:version{bl_info['version']}")
+    for name in module_names:
+        namespace[name].register()
+    if bpy.app.background:
+        # blender -bではすぐにオペレーターを使うので待たない
+        register_deferred()
+    else:
+        # 読み込むファイルが変わってもタイマーが消えないようにpersistentにする
+        bpy.app.timers.register(register_deferred, first_interval=0.0, persistent=True)
 
 
 def unregister():
-    for module in namespace.values():
-        module.unregister()
-    logger.info(f"unregistered {bl_info['name']}:version{bl_info['version']}")
+    names = module_names + deferred_module_names
+    if bpy.app.timers.is_registered(register_deferred):
+        # 起動が終わる前に無効にしたので後回しのモジュールはまだ登録していない
+        bpy.app.timers.unregister(register_deferred)
+        names = module_names
+    logger.info("unregistered %s:version%s", bl_info["name"], bl_info["version"])
+    for name in reversed(names):
+        namespace[name].unregister()
 
 
 if __name__ == "__main__":
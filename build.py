@@ -12,6 +12,7 @@ file_list = [
     "README.md",
     "CHANGELOG.md",
     "__init__.py",
+    "cli.py",
     "lib",
 ]
 
@@ -0,0 +1,30 @@
+# マニフェストから縦書きテキストをまとめて作る
+# blender -b [file.blend] -P <addon>/cli.py -- manifest.json [--output out.blend]
+# ワーカーのプロセスに分けて作る
+# blender -b -P <addon>/cli.py -- shard manifest.json --workers 16 --output out.blend
+# ベンチマーク
+# blender -b -P <addon>/cli.py -- bench --output result.json [--baseline base.json]
+import importlib
+import os
+import sys
+
+import bpy
+
+# -Pで実行するとパッケージとして読まれないのでアドオンのディレクトリから読み込む
+addon_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(addon_dir))
+addon = importlib.import_module(os.path.basename(addon_dir))
+
+# アドオンが有効になっていなければ登録する
+if bpy.types.Object.bl_rna.properties.get("tategaki_objects") is None:
+    addon.register()
+
+argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+if len(argv) != 0 and argv[0] == "shard":
+    shard = importlib.import_module(f"{addon.__name__}.lib.shard")
+    sys.exit(shard.main(argv[1:]))
+if len(argv) != 0 and argv[0] == "bench":
+    verify = importlib.import_module(f"{addon.__name__}.lib.verify")
+    sys.exit(verify.main(argv[1:]))
+batch = importlib.import_module(f"{addon.__name__}.lib.batch")
+sys.exit(batch.main(argv))
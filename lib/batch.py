@@ -0,0 +1,378 @@
+# マニフェストから縦書きテキストをまとめて作るところ blender -b で使う
+# cli.pyから呼ぶ
+# マニフェスト(json):
+#   {
+#     "output": "out.blend",      .blendに結果のコレクションを書き出す(省略可)
+#     "export_dir": "export",     変換したオブジェクトを1つずつ.objで書き出す(省略可)
+#     "report": "report.json",    時間のレポート(省略可)
+#     "disk_cache": false,        文字ごとのメッシュのキャッシュをディスクにも保存する
+#     "cache_dir": null,          そのディレクトリ(省略するとユーザー設定ディレクトリ)
+#     "warm_charset": null,       先にカーニングヒントをキャッシュする文字集合 "KANA"など
+#     "defaults": {...},          itemsの省略したフィールドの値
+#     "items": [{"name": "a", "text": "本文", "font": "path/to/font.otf", ...}]
+#   }
+# マニフェスト(csv): 1行1item ヘッダーはitemのフィールド名 ほかは引数で渡す
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import traceback
+from logging import getLogger
+import bpy
+from bpy.types import Object, VectorFont
+from . import footprint
+from . import glyph_cache
+from . import hint_cache
+from . import trace
+from .tategaki import TATEGAKI, TategakiTextUtil, is_container
+
+logger = getLogger(__name__)
+
+SOURCE_COLLECTION = "tategaki_sources"  # 変換元のテキストオブジェクトを入れておく
+# メモリの確保の記録に残すitemの設定
+TRACKED_SETTINGS = (
+    "backend",
+    "limit_length",
+    "chr_spacing",
+    "line_spacing",
+    "auto_kerning",
+    "freeze",
+    "resolution",
+)
+
+ITEM_DEFAULTS = {
+    "name": "tategaki",
+    "text": "",
+    "font": None,  # Noneは組み込みフォント
+    "font_bold": None,  # Noneはfontと同じ
+    "font_italic": None,
+    "font_bold_italic": None,
+    "backend": "OBJECTS",
+    "limit_length": 20,
+    "chr_spacing": 1.0,
+    "line_spacing": 1.0,
+    "auto_kerning": False,
+    "freeze": "NONE",  # "NONE", "MESH", "CURVE", "GPENCIL"
+    "resolution": 2,
+}
+
+# csvは文字列で読まれるので型をそろえる
+FIELD_TYPES = {
+    "limit_length": int,
+    "chr_spacing": float,
+    "line_spacing": float,
+    "resolution": int,
+    "auto_kerning": lambda v: str(v).lower() in ("1", "true", "yes"),
+}
+BACKENDS = ("OBJECTS", "INSTANCES")
+
+
+def load_manifest(path: str) -> dict:
+    """jsonかcsvのマニフェストを読む csvはitemsだけのマニフェストになる"""
+    if os.path.splitext(path)[1].lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            items = [
+                {key: value for key, value in row.items() if value != ""}
+                for row in csv.DictReader(f)
+            ]
+        return {"items": items}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_items(manifest: dict) -> list[dict]:
+    """
+    defaultsを埋めて型をそろえたitemのリスト テキストの改行は\\nで書ける
+    resolvedのマニフェスト(shardがワーカーに渡すもの)は埋めてあるのでそのまま返す
+    """
+    if manifest.get("resolved"):
+        return list(manifest.get("items", []))
+    defaults = {**ITEM_DEFAULTS, **manifest.get("defaults", {})}
+    items = []
+    for i, raw in enumerate(manifest.get("items", [])):
+        item = {**defaults, **raw}
+        if "name" not in raw:
+            item["name"] = f"{defaults['name']}.{i:05d}"
+        for key, to_type in FIELD_TYPES.items():
+            item[key] = to_type(item[key])
+        item["text"] = item["text"].replace("\\n", "\n")
+        item["freeze"] = item["freeze"].upper()
+        item["backend"] = str(item["backend"]).upper()
+        if item["backend"] not in BACKENDS:
+            raise ValueError(
+                f"item '{item['name']}': backend must be one of {', '.join(BACKENDS)}"
+            )
+        items.append(item)
+    return items
+
+
+def load_font(path: str = None) -> VectorFont:
+    """フォントファイルを読む 読み込み済みならそれを使う"""
+    if path is None:
+        return bpy.data.fonts.load("<builtin>", check_existing=True)
+    return bpy.data.fonts.load(os.path.abspath(path), check_existing=True)
+
+
+def get_source_collection() -> bpy.types.Collection:
+    """変換元のテキストオブジェクトを入れる非表示のコレクション"""
+    collection = bpy.data.collections.get(SOURCE_COLLECTION)
+    if collection is None:
+        collection = bpy.data.collections.new(SOURCE_COLLECTION)
+        collection.hide_viewport = True
+        collection.hide_render = True
+        bpy.context.scene.collection.children.link(collection)
+    return collection
+
+
+def create_text_object(item: dict) -> Object:
+    """itemから変換元のテキストオブジェクトを作る"""
+    font = load_font(item["font"])
+    data = bpy.data.curves.new(item["name"], "FONT")
+    data.body = item["text"]
+    data.font = font
+    data.font_bold = load_font(item["font_bold"]) if item["font_bold"] else font
+    data.font_italic = load_font(item["font_italic"]) if item["font_italic"] else font
+    data.font_bold_italic = (
+        load_font(item["font_bold_italic"]) if item["font_bold_italic"] else font
+    )
+    obj = bpy.data.objects.new(item["name"], data)
+    get_source_collection().objects.link(obj)
+    return obj
+
+
+def warm_caches(t_util: TategakiTextUtil, items: list[dict], charset: str):
+    """
+    itemで使うフォントごとに文字集合ぶんのカーニングヒントをキャッシュしておく
+    変換と同じ細分化数で作るのでconvert_itemでそのまま使われる
+    """
+    characters = hint_cache.charset_characters(charset)
+    done = set()
+    for item in items:
+        key = (item["font"], item["resolution"])
+        if key in done:
+            continue
+        done.add(key)
+        font = load_font(item["font"])
+        t_util.warm_kerning_hint_cache(font, characters, item["resolution"])
+
+
+def freeze_item(t_util: TategakiTextUtil, item: dict) -> tuple[Object, set]:
+    """
+    縦書きテキストを変換して、変換したオブジェクトだけ残す
+    :return (変換したオブジェクト, 使われなくなるかもしれないアドオンのデータ)
+    """
+    state = t_util.state
+    container = state["container"]
+    obj = t_util.freeze(bpy.context, item["resolution"], item["freeze"])
+    obj.parent = None
+    obj.location = container.location
+    bpy.data.collections[state["name"]].objects.unlink(obj)
+    owned = t_util.remove_tategaki_text(state)
+    # 変換元のテキストオブジェクトも残さない
+    original = state["original"]
+    data = original.data
+    bpy.data.objects.remove(original)
+    bpy.data.curves.remove(data)
+    obj.name = item["name"]
+
+    collection = bpy.data.collections.new(item["name"])
+    bpy.context.scene.collection.children.link(collection)
+    collection.objects.link(obj)
+    return obj, owned
+
+
+def detach_originals(collections):
+    """
+    コンテナのstateから変換元のテキストオブジェクトへの参照を外す
+    参照が残っているとlibraries.writeで変換元もいっしょに書き出される
+    """
+    for collection in collections:
+        for obj in collection.all_objects:
+            if is_container(obj):
+                obj[TATEGAKI].pop("original", None)
+
+
+def export_object(obj: Object, path: str):
+    """オブジェクトを1つだけ.objで書き出す"""
+    for selected in bpy.context.selected_objects:
+        selected.select_set(False)
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+    if bpy.app.version >= (3, 2, 0):
+        bpy.ops.wm.obj_export(filepath=path, export_selected_objects=True)
+    else:
+        bpy.ops.export_scene.obj(filepath=path, use_selection=True)
+    trace.count("bpy.ops")
+
+
+def convert_item(t_util: TategakiTextUtil, item: dict, export_dir: str = None):
+    """
+    1itemぶん縦書きテキストを作って、必要なら変換と書き出しをする
+    :return (結果のコレクション, レポート, 使われなくなるかもしれないアドオンのデータ)
+    """
+    timings = {}
+    start = time.perf_counter()
+    text_object = create_text_object(item)
+    t_util.convert_text_object(
+        text_object,
+        backend=item["backend"],
+        limit_length=item["limit_length"],
+        chr_spacing=item["chr_spacing"],
+        line_spacing=item["line_spacing"],
+        auto_kerning=item["auto_kerning"],
+        resolution=item["resolution"],
+    )
+    timings["convert"] = time.perf_counter() - start
+    collection = bpy.data.collections[t_util.state["name"]]
+    owned = set()
+
+    if item["freeze"] != "NONE":
+        freeze_start = time.perf_counter()
+        obj, owned = freeze_item(t_util, item)
+        collection = obj.users_collection[0]
+        timings["freeze"] = time.perf_counter() - freeze_start
+        if export_dir is not None and item["freeze"] != "GPENCIL":
+            export_start = time.perf_counter()
+            export_object(obj, os.path.join(export_dir, f"{item['name']}.obj"))
+            timings["export"] = time.perf_counter() - export_start
+
+    timings["total"] = time.perf_counter() - start
+    report = {
+        "name": item["name"],
+        "collection": collection.name,
+        "characters": len(item["text"].replace("\n", "")),
+        "status": "ok",
+        "timings": timings,
+    }
+    return collection, report, owned
+
+
+def run_manifest(manifest: dict) -> dict:
+    """マニフェストのitemを1つのセッションで順番に作って、時間のレポートを返す"""
+    start = time.perf_counter()
+    items = resolve_items(manifest)
+    export_dir = manifest.get("export_dir")
+    if export_dir is not None:
+        os.makedirs(export_dir, exist_ok=True)
+    glyph_cache.set_persistent(
+        manifest.get("disk_cache", False), manifest.get("cache_dir")
+    )
+
+    # utilを共有するのでカーニングヒントと句読点オフセットは全体で使いまわす
+    t_util = TategakiTextUtil()
+    warm_time = 0.0
+    if manifest.get("warm_charset"):
+        warm_start = time.perf_counter()
+        warm_caches(t_util, items, manifest["warm_charset"])
+        warm_time = time.perf_counter() - warm_start
+
+    reports = []
+    collections = []
+    owned = set()
+    for item in items:
+        settings = {key: item[key] for key in TRACKED_SETTINGS}
+        settings["characters"] = len(item["text"])
+        try:
+            with trace.span(item["name"], "item"), footprint.track_allocations(
+                item["name"], settings
+            ):
+                collection, report, item_owned = convert_item(t_util, item, export_dir)
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            report = {"name": item["name"], "status": "error", "error": repr(e)}
+        else:
+            collections.append(collection)
+            owned.update(item_owned)
+        reports.append(report)
+        logger.info("%s: %s", item["name"], report["status"])
+    TategakiTextUtil.remove_unused_owned_data(owned)
+
+    write_time = 0.0
+    output = manifest.get("output")
+    if output is not None:
+        write_start = time.perf_counter()
+        detach_originals(collections)
+        # appendで取り出せるようにコレクションをフェイクユーザーつきで書き出す
+        bpy.data.libraries.write(
+            os.path.abspath(output), set(collections), fake_user=True
+        )
+        write_time = time.perf_counter() - write_start
+
+    cache = glyph_cache.get_cache()
+    return {
+        "blender": bpy.app.version_string,
+        "items": reports,
+        "succeeded": sum(report["status"] == "ok" for report in reports),
+        "failed": sum(report["status"] != "ok" for report in reports),
+        "characters": sum(report.get("characters", 0) for report in reports),
+        "glyph_cache": {"hits": cache.hits, "misses": cache.misses},
+        "timings": {
+            "warm": warm_time,
+            "items": sum(r["timings"]["total"] for r in reports if "timings" in r),
+            "write": write_time,
+            "total": time.perf_counter() - start,
+        },
+        "output": output,
+    }
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="blender -b -P cli.py --",
+        description="Create vertical texts from a manifest",
+    )
+    parser.add_argument("manifest", help="json or csv manifest")
+    parser.add_argument("--output", help=".blend file to write the results")
+    parser.add_argument("--export-dir", help="directory to export frozen objects")
+    parser.add_argument("--report", help="json file to write the timing report")
+    parser.add_argument(
+        "--disk-cache", action="store_true", help="store glyph meshes on disk"
+    )
+    parser.add_argument("--cache-dir", help="directory of the glyph mesh cache")
+    parser.add_argument("--trace", help="json file to write a Chrome trace")
+    parser.add_argument(
+        "--track-allocations",
+        help="json file to write Python memory allocations of each item",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]) -> int:
+    """
+    引数はblenderの--より後ろ 引数はマニフェストの値より優先する
+    :return 失敗したitemがあれば1
+    """
+    args = parse_args(argv)
+    manifest = load_manifest(args.manifest)
+    for key in ("output", "export_dir", "report", "cache_dir"):
+        value = getattr(args, key)
+        if value is not None:
+            manifest[key] = value
+    if args.disk_cache:
+        manifest["disk_cache"] = True
+
+    if args.trace is not None:
+        trace.start()
+    if args.track_allocations is not None:
+        footprint.start_tracking()
+    report = run_manifest(manifest)
+    if args.trace is not None:
+        trace.stop()
+        trace.export_chrome_trace(args.trace)
+    if args.track_allocations is not None:
+        footprint.stop_tracking()
+        footprint.export_records(args.track_allocations)
+    write_report(report, manifest.get("report"))
+    return 0 if report["failed"] == 0 else 1
+
+
+def write_report(report: dict, path: str = None):
+    """レポートをjsonで書き出す 標準出力の最後の行にも出す"""
+    text = json.dumps(report, ensure_ascii=False)
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    sys.stdout.write(text + "\n")
+    sys.stdout.flush()
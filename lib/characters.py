@@ -0,0 +1,136 @@
+# 縦書きテキストの文字を配列で持つところ 文字ごとのdictを作らない
+# text: 改行を除いた文字を並べた1つの文字列
+# formats: 文字ごとのマテリアル番号と太字/斜体/スモールキャップスを1つのintに詰めたarray('H')
+# offsets: 改行で分けた段落の始まりの位置と最後に文字数を入れたarray('I')
+# 行文字数制限での折り返しは段落ごとに始まりの位置を求めるだけで、文字のコピーはしない
+from array import array
+from itertools import accumulate
+
+FORMAT_BOLD = 1
+FORMAT_ITALIC = 2
+FORMAT_SMALL_CAPS = 4
+MATERIAL_SHIFT = 3
+# 3bitのフラグのあとにマテリアル番号を入れるので'B'だと32個までになる 'H'なら8192個
+FORMAT_TYPECODE = "H"
+OFFSET_TYPECODE = "I"
+
+
+def pack_format(
+    material_index: int, use_bold: bool, use_italic: bool, use_small_caps: bool
+) -> int:
+    value = material_index << MATERIAL_SHIFT
+    if use_bold:
+        value |= FORMAT_BOLD
+    if use_italic:
+        value |= FORMAT_ITALIC
+    if use_small_caps:
+        value |= FORMAT_SMALL_CAPS
+    return value
+
+
+def material_index(value: int) -> int:
+    return value >> MATERIAL_SHIFT
+
+
+def is_bold(value: int) -> bool:
+    return bool(value & FORMAT_BOLD)
+
+
+def is_italic(value: int) -> bool:
+    return bool(value & FORMAT_ITALIC)
+
+
+def wrap_offsets(offsets, limit_length: int) -> array:
+    """
+    段落の始まりの位置から行文字数制限で折り返した行の始まりの位置を求める
+    最後に文字数を入れる 空の段落も1行になる
+    """
+    lines = array(OFFSET_TYPECODE)
+    for start, end in zip(offsets, offsets[1:]):
+        if end - start > limit_length:
+            lines.extend(range(start, end, limit_length))
+        else:
+            lines.append(start)
+    lines.append(offsets[-1])
+    return lines
+
+
+class CharacterArray:
+    """縦書きテキストの文字とフォーマットと段落 作ったあとは書き換えない"""
+
+    __slots__ = ("text", "formats", "offsets")
+
+    def __init__(self, text: str = "", formats: array = None, offsets: array = None):
+        self.text = text
+        self.formats = array(FORMAT_TYPECODE) if formats is None else formats
+        self.offsets = array(OFFSET_TYPECODE, [0]) if offsets is None else offsets
+
+    @classmethod
+    def from_paragraphs(cls, paragraphs: list[str], formats) -> "CharacterArray":
+        """改行で分けた段落と改行を除いた文字ごとのフォーマットから作る"""
+        offsets = array(OFFSET_TYPECODE, [0])
+        offsets.extend(accumulate(len(paragraph) for paragraph in paragraphs))
+        return cls("".join(paragraphs), array(FORMAT_TYPECODE, formats), offsets)
+
+    @classmethod
+    def from_props(cls, lines: list) -> "CharacterArray":
+        """古いstateの文字ごとのdictの行のリストから作る"""
+        paragraphs = ["".join(prop["character"] for prop in line) for line in lines]
+        formats = [
+            pack_format(
+                prop["material_index"],
+                prop["use_bold"],
+                prop["use_italic"],
+                prop["use_small_caps"],
+            )
+            for line in lines
+            for prop in line
+        ]
+        return cls.from_paragraphs(paragraphs, formats)
+
+    def __len__(self):
+        return len(self.text)
+
+    def __eq__(self, other):
+        if not isinstance(other, CharacterArray):
+            return NotImplemented
+        return (
+            self.text == other.text
+            and self.formats == other.formats
+            and self.offsets == other.offsets
+        )
+
+    @property
+    def paragraph_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def paragraph_lengths(self) -> list[int]:
+        return [end - start for start, end in zip(self.offsets, self.offsets[1:])]
+
+    def paragraphs(self) -> list[str]:
+        """改行で分けた行ごとの文字列"""
+        text = self.text
+        return [text[start:end] for start, end in zip(self.offsets, self.offsets[1:])]
+
+    def line_offsets(self, limit_length: int) -> array:
+        """行文字数制限で折り返した行の始まりの位置 段落の数だけの計算で済む"""
+        return wrap_offsets(self.offsets, limit_length)
+
+    def line_ranges(self, limit_length: int) -> list[tuple[int, int]]:
+        """折り返した行ごとの(始まり, 終わり)"""
+        lines = self.line_offsets(limit_length)
+        return list(zip(lines, lines[1:]))
+
+    def tokens(self) -> list:
+        """
+        差分を取るために文字を1列のトークンにする
+        文字は(文字, フォーマット)のtuple、改行はNone
+        """
+        tokens = []
+        text = self.text
+        formats = self.formats
+        for i, (start, end) in enumerate(zip(self.offsets, self.offsets[1:])):
+            if i != 0:
+                tokens.append(None)
+            tokens.extend(zip(text[start:end], formats[start:end]))
+        return tokens
@@ -0,0 +1,216 @@
+# 縦書きテキストがどれくらいメモリとデータブロックを使っているかを見積もるところ
+# サイズはBlenderの構造体のおおよその大きさから求めた目安で、正確な値ではない
+# tracemallocでオペレーターの実行中にPython側で確保したメモリも記録できる
+#   footprint.start_tracking()
+#   with footprint.track_allocations("tategaki.update_chr_spacing Text", settings):
+#       ...
+#   records = footprint.stop_tracking()
+import contextlib
+import json
+import tracemalloc
+from logging import getLogger
+import bpy
+
+logger = getLogger(__name__)
+
+# IDPropertyの構造体(名前64byteを含む)のおおよその大きさ
+IDPROP_HEADER_BYTES = 136
+IDPROP_ITEM_BYTES = {"i": 4, "f": 4, "d": 8, "b": 1}
+
+# メッシュの要素ごとのおおよその大きさ
+MESH_VERTEX_BYTES = 16  # 位置とフラグ
+MESH_EDGE_BYTES = 12
+MESH_LOOP_BYTES = 8  # 頂点と辺の番号
+MESH_POLYGON_BYTES = 16  # ループの始まり、数、マテリアル番号
+MESH_UV_BYTES = 8  # UVレイヤーごとにループあたり
+# 属性の要素ごと 位置やマテリアル番号など上で数えているものは除く
+ATTRIBUTE_BYTES = {
+    "FLOAT": 4,
+    "INT": 4,
+    "FLOAT_VECTOR": 12,
+    "FLOAT_COLOR": 16,
+    "BYTE_COLOR": 4,
+    "STRING": 8,
+    "BOOLEAN": 1,
+    "FLOAT2": 8,
+    "INT8": 1,
+}
+BUILTIN_ATTRIBUTES = ("position", "material_index")
+# カーブの点ごと
+BEZIER_POINT_BYTES = 56  # 位置とハンドル2つ、半径、傾き、フラグ
+SPLINE_POINT_BYTES = 28
+SPLINE_BYTES = 112
+# gpencilの点とストロークごと
+GPENCIL_POINT_BYTES = 64
+GPENCIL_STROKE_BYTES = 240
+GPENCIL_TRIANGLE_BYTES = 12
+
+TOP_COUNT = 5  # 記録ごとに残す確保の多い行の数
+
+_records: list[dict] = []
+
+
+def idprop_size(value) -> tuple[int, int]:
+    """
+    id-propのおおよその大きさ
+    :return (プロパティの数, byte)
+    """
+    if hasattr(value, "keys"):
+        count, size = 1, IDPROP_HEADER_BYTES
+        for key in value.keys():
+            child_count, child_size = idprop_size(value[key])
+            count += child_count
+            size += child_size
+        return count, size
+    if hasattr(value, "typecode"):
+        item = IDPROP_ITEM_BYTES.get(value.typecode, 8)
+        return 1, IDPROP_HEADER_BYTES + len(value) * item
+    if isinstance(value, str):
+        return 1, IDPROP_HEADER_BYTES + len(value.encode("utf-8")) + 1
+    if isinstance(value, (list, tuple)):
+        count, size = 1, IDPROP_HEADER_BYTES
+        for item in value:
+            child_count, child_size = idprop_size(item)
+            count += child_count
+            size += child_size
+        return count, size
+    # int, float, IDへの参照
+    return 1, IDPROP_HEADER_BYTES
+
+
+def mesh_bytes(mesh: bpy.types.Mesh) -> int:
+    size = (
+        len(mesh.vertices) * MESH_VERTEX_BYTES
+        + len(mesh.edges) * MESH_EDGE_BYTES
+        + len(mesh.loops) * (MESH_LOOP_BYTES + len(mesh.uv_layers) * MESH_UV_BYTES)
+        + len(mesh.polygons) * MESH_POLYGON_BYTES
+    )
+    domain_sizes = {
+        "POINT": len(mesh.vertices),
+        "EDGE": len(mesh.edges),
+        "FACE": len(mesh.polygons),
+        "CORNER": len(mesh.loops),
+    }
+    skip = set(BUILTIN_ATTRIBUTES) | {layer.name for layer in mesh.uv_layers}
+    for attribute in getattr(mesh, "attributes", []):
+        # .から始まるのは内部の属性
+        if attribute.name in skip or attribute.name.startswith("."):
+            continue
+        item = ATTRIBUTE_BYTES.get(attribute.data_type, 4)
+        size += domain_sizes.get(attribute.domain, 0) * item
+    return size
+
+
+def curve_bytes(curve: bpy.types.Curve) -> int:
+    size = 0
+    for spline in curve.splines:
+        size += SPLINE_BYTES
+        size += len(spline.bezier_points) * BEZIER_POINT_BYTES
+        size += len(spline.points) * SPLINE_POINT_BYTES
+    return size
+
+
+def gpencil_bytes(gpencil: bpy.types.GreasePencil) -> int:
+    size = 0
+    for layer in gpencil.layers:
+        for frame in layer.frames:
+            for stroke in frame.strokes:
+                size += GPENCIL_STROKE_BYTES
+                size += len(stroke.points) * GPENCIL_POINT_BYTES
+                size += len(stroke.triangles) * GPENCIL_TRIANGLE_BYTES
+    return size
+
+
+def data_bytes(data) -> int:
+    """メッシュ、カーブ、gpencilのデータのおおよその大きさ ほかは0"""
+    if isinstance(data, bpy.types.Mesh):
+        return mesh_bytes(data)
+    if isinstance(data, bpy.types.TextCurve):
+        return 0
+    if isinstance(data, bpy.types.Curve):
+        return curve_bytes(data)
+    if isinstance(data, bpy.types.GreasePencil):
+        return gpencil_bytes(data)
+    return 0
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def start_tracking(frames: int = 1):
+    """tracemallocでPython側のメモリの確保を記録し始める 前の記録は消す"""
+    _records.clear()
+    tracemalloc.start(frames)
+
+
+def stop_tracking() -> list[dict]:
+    """記録をやめて、track_allocationsの記録を返す"""
+    tracemalloc.stop()
+    return list(_records)
+
+
+def is_tracking() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def records() -> list[dict]:
+    return list(_records)
+
+
+@contextlib.contextmanager
+def track_allocations(label: str, settings: dict = None):
+    """
+    withの中で確保して残ったメモリとピークを記録する 記録していないときは何もしない
+    スナップショットを2回取るので記録中は遅くなる
+    """
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    # tracemalloc自身の確保は数えない
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        after_current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        top = []
+        for stat in after.compare_to(before, "lineno")[:TOP_COUNT]:
+            frame = stat.traceback[0]
+            top.append(
+                {
+                    "location": f"{frame.filename}:{frame.lineno}",
+                    "size": stat.size_diff,
+                    "count": stat.count_diff,
+                }
+            )
+        record = {
+            "label": label,
+            "settings": settings or {},
+            "allocated": after_current - current,
+            "peak": peak - current,
+            "top": top,
+        }
+        _records.append(record)
+        logger.debug("%s", format_record(record))
+
+
+def format_record(record: dict) -> str:
+    settings = ", ".join(f"{key}={value}" for key, value in record["settings"].items())
+    return (
+        f"{record['label']}: allocated {format_bytes(record['allocated'])},"
+        f" peak {format_bytes(record['peak'])} ({settings})"
+    )
+
+
+def export_records(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(_records, f, indent=2)
+    logger.info("wrote allocations: %s", path)
@@ -0,0 +1,362 @@
+# 縦書きテキストをオペレータを使わずに1つのデータにまとめるところ
+# 重複しない文字ごとに一度だけ変換して、配置ぶんをNumPyで並べる
+from typing import NamedTuple
+import bpy
+from bpy.types import Curve, Mesh, Object
+import numpy as np
+from .trace import traced
+from . import glyph_cache
+from .glyph_cache import GlyphMesh
+
+
+class GlyphPlacement(NamedTuple):
+    """同じfont.characterの文字の配置をまとめたもの"""
+
+    obj: Object  # 変換に使う代表の文字オブジェクト
+    matrices: np.ndarray  # (k, 4, 4) コンテナ基準の行列
+    material_indices: np.ndarray  # (k,) int32
+
+
+def make_placement(
+    obj: Object, matrices: list, material_indices: list[int]
+) -> GlyphPlacement:
+    """mathutils.Matrixのリストから配置を作る"""
+    return GlyphPlacement(
+        obj,
+        np.array(
+            [[tuple(row) for row in matrix] for matrix in matrices], dtype=np.float64
+        ).reshape(-1, 4, 4),
+        np.array(material_indices, dtype=np.int32),
+    )
+
+
+def mesh_to_arrays(mesh: Mesh) -> GlyphMesh:
+    """メッシュから頂点、ループ、ポリゴンの配列を取り出す"""
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    loop_vertex = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertex)
+    loop_start = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+    loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    return GlyphMesh(co.reshape(-1, 3), loop_vertex, loop_start, loop_total)
+
+
+def glyph_mesh_from_object(obj: Object) -> GlyphMesh:
+    """文字オブジェクトをメッシュに変換して配列だけ取り出す 一時メッシュは消す"""
+    mesh = bpy.data.meshes.new_from_object(obj)
+    try:
+        return mesh_to_arrays(mesh)
+    finally:
+        bpy.data.meshes.remove(mesh)
+
+
+def get_glyph_mesh(obj: Object) -> GlyphMesh:
+    """キャッシュになければ文字オブジェクトをメッシュに変換してキャッシュする"""
+    cache = glyph_cache.get_cache()
+    key = glyph_cache.glyph_key(obj.data)
+    glyph = None if key is None else cache.get(key)
+    if glyph is None:
+        glyph = glyph_mesh_from_object(obj)
+        if key is not None:
+            cache.put(key, glyph)
+    return glyph
+
+
+def transform_points(co: np.ndarray, matrices: np.ndarray) -> np.ndarray:
+    """(V, 3)の座標を(k, 4, 4)の行列でそれぞれ変換して(k, V, 3)で返す"""
+    rotation_scale = matrices[:, :3, :3]
+    translation = matrices[:, :3, 3]
+    return np.einsum("kij,vj->kvi", rotation_scale, co) + translation[:, None, :]
+
+
+def tile_glyph_meshes(glyphs: list[GlyphMesh], placements: list[GlyphPlacement]):
+    """
+    文字ごとのメッシュを配置の数だけ並べて1つのメッシュの配列にする
+    :return (co, loop_vertex, loop_start, loop_total, material_index)
+    """
+    co_list, loop_vertex_list, loop_start_list = [], [], []
+    loop_total_list, material_list = [], []
+    vertex_offset = 0
+    loop_offset = 0
+    for glyph, placement in zip(glyphs, placements):
+        count = len(placement.matrices)
+        vertex_len = len(glyph.co)
+        loop_len = len(glyph.loop_vertex)
+        polygon_len = len(glyph.loop_start)
+        if count == 0 or polygon_len == 0:
+            continue
+        steps = np.arange(count, dtype=np.int32)[:, None]
+        co_list.append(transform_points(glyph.co, placement.matrices).reshape(-1, 3))
+        loop_vertex_list.append(
+            (glyph.loop_vertex + vertex_offset + steps * vertex_len).ravel()
+        )
+        loop_start_list.append(
+            (glyph.loop_start + loop_offset + steps * loop_len).ravel()
+        )
+        loop_total_list.append(np.tile(glyph.loop_total, count))
+        material_list.append(np.repeat(placement.material_indices, polygon_len))
+        vertex_offset += vertex_len * count
+        loop_offset += loop_len * count
+
+    if len(co_list) == 0:
+        empty = np.empty(0, dtype=np.int32)
+        return np.empty((0, 3), dtype=np.float32), empty, empty, empty, empty
+    return (
+        np.concatenate(co_list).astype(np.float32),
+        np.concatenate(loop_vertex_list).astype(np.int32),
+        np.concatenate(loop_start_list).astype(np.int32),
+        np.concatenate(loop_total_list).astype(np.int32),
+        np.concatenate(material_list).astype(np.int32),
+    )
+
+
+def write_mesh(
+    name: str,
+    co: np.ndarray,
+    loop_vertex: np.ndarray,
+    loop_start: np.ndarray,
+    loop_total: np.ndarray,
+    material_index: np.ndarray,
+) -> Mesh:
+    """配列からforeach_setでまとめてメッシュを作る"""
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(co))
+    mesh.loops.add(len(loop_vertex))
+    mesh.polygons.add(len(loop_start))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.foreach_set("vertex_index", loop_vertex)
+    mesh.polygons.foreach_set("loop_start", loop_start)
+    mesh.polygons.foreach_set("loop_total", loop_total)
+    mesh.polygons.foreach_set("material_index", material_index)
+    mesh.update(calc_edges=True)
+    return mesh
+
+
+@traced
+def build_mesh(name: str, placements: list[GlyphPlacement]) -> Mesh:
+    """重複しない文字ごとに一度だけメッシュに変換して1つのメッシュにまとめる"""
+    glyphs = [get_glyph_mesh(placement.obj) for placement in placements]
+    return write_mesh(name, *tile_glyph_meshes(glyphs, placements))
+
+
+class GlyphSpline(NamedTuple):
+    """文字の輪郭のスプライン1本ぶんの配列"""
+
+    type: str
+    use_cyclic_u: bool
+    co: np.ndarray  # BEZIERは(n, 3) それ以外は(n, 4)
+    handle_left: np.ndarray  # (n, 3) BEZIERのみ
+    handle_right: np.ndarray  # (n, 3) BEZIERのみ
+    handle_left_type: np.ndarray  # (n,) BEZIERのみ
+    handle_right_type: np.ndarray  # (n,) BEZIERのみ
+
+
+def _points_get(points, attr: str, width: int, dtype=np.float32) -> np.ndarray:
+    array = np.empty(len(points) * width, dtype=dtype)
+    points.foreach_get(attr, array)
+    return array.reshape(-1, width) if width != 1 else array
+
+
+def glyph_splines_from_object(obj: Object, depsgraph) -> list[GlyphSpline]:
+    """文字オブジェクトの輪郭をカーブにしてスプラインごとの配列を取り出す"""
+    obj_eval = obj.evaluated_get(depsgraph)
+    curve = obj_eval.to_curve(depsgraph)
+    splines = []
+    try:
+        for spline in curve.splines:
+            if spline.type == "BEZIER":
+                points = spline.bezier_points
+                splines.append(
+                    GlyphSpline(
+                        spline.type,
+                        spline.use_cyclic_u,
+                        _points_get(points, "co", 3),
+                        _points_get(points, "handle_left", 3),
+                        _points_get(points, "handle_right", 3),
+                        _points_get(points, "handle_left_type", 1, np.int32),
+                        _points_get(points, "handle_right_type", 1, np.int32),
+                    )
+                )
+            else:
+                points = spline.points
+                splines.append(
+                    GlyphSpline(
+                        spline.type,
+                        spline.use_cyclic_u,
+                        _points_get(points, "co", 4),
+                        None,
+                        None,
+                        None,
+                        None,
+                    )
+                )
+    finally:
+        obj_eval.to_curve_clear()
+    return splines
+
+
+@traced
+def build_curve(name: str, placements: list[GlyphPlacement], depsgraph) -> Curve:
+    """
+    重複しない文字ごとに一度だけ輪郭を取り出して、配置ぶんのスプラインを
+    1つのカーブにforeach_setで書き込む
+    """
+    curve = bpy.data.curves.new(name, "CURVE")
+    new_splines = curve.splines.new
+    material_indices = []
+    cyclic = []
+    for placement in placements:
+        glyph_splines = glyph_splines_from_object(placement.obj, depsgraph)
+        for matrix, material_index in zip(
+            placement.matrices, placement.material_indices
+        ):
+            rotation_scale = matrix[:3, :3].T
+            translation = matrix[:3, 3]
+            for glyph_spline in glyph_splines:
+                spline = new_splines(glyph_spline.type)
+                count = len(glyph_spline.co)
+                if glyph_spline.type == "BEZIER":
+                    points = spline.bezier_points
+                    # 新しいスプラインには最初から1点ある
+                    points.add(count - 1)
+                    for attr in ("co", "handle_left", "handle_right"):
+                        co = getattr(glyph_spline, attr) @ rotation_scale + translation
+                        points.foreach_set(attr, co.astype(np.float32).ravel())
+                    points.foreach_set(
+                        "handle_left_type", glyph_spline.handle_left_type
+                    )
+                    points.foreach_set(
+                        "handle_right_type", glyph_spline.handle_right_type
+                    )
+                else:
+                    points = spline.points
+                    points.add(count - 1)
+                    co = glyph_spline.co.copy()
+                    co[:, :3] = co[:, :3] @ rotation_scale + translation
+                    points.foreach_set("co", co.astype(np.float32).ravel())
+                material_indices.append(material_index)
+                cyclic.append(glyph_spline.use_cyclic_u)
+    curve.splines.foreach_set("material_index", np.array(material_indices, np.int32))
+    curve.splines.foreach_set("use_cyclic_u", np.array(cyclic, dtype=bool))
+    return curve
+
+
+class GlyphOutline(NamedTuple):
+    """文字の輪郭1本ぶんの折れ線"""
+
+    points: np.ndarray  # (m, 3) float32
+    is_hole: bool  # 穴の輪郭かどうか
+
+
+def sample_spline(spline: GlyphSpline, resolution: int) -> np.ndarray:
+    """スプラインをセグメントごとにresolution点で折れ線にする"""
+    if spline.type != "BEZIER":
+        return spline.co[:, :3]
+    co = spline.co
+    count = len(co) if spline.use_cyclic_u else len(co) - 1
+    p0 = co[:count]
+    p1 = spline.handle_right[:count]
+    p2 = np.roll(spline.handle_left, -1, axis=0)[:count]
+    p3 = np.roll(co, -1, axis=0)[:count]
+    t = (np.arange(resolution, dtype=np.float32) / resolution)[None, :, None]
+    mt = 1.0 - t
+    points = (
+        mt ** 3 * p0[:, None]
+        + 3.0 * mt ** 2 * t * p1[:, None]
+        + 3.0 * mt * t ** 2 * p2[:, None]
+        + t ** 3 * p3[:, None]
+    ).reshape(-1, 3)
+    if not spline.use_cyclic_u:
+        points = np.concatenate([points, co[-1:]])
+    return points.astype(np.float32)
+
+
+def point_in_polygon(point: np.ndarray, polygon: np.ndarray) -> bool:
+    """xy平面で点が多角形の内側にあるかどうか"""
+    x, y = point[0], point[1]
+    xs, ys = polygon[:, 0], polygon[:, 1]
+    xs2, ys2 = np.roll(xs, -1), np.roll(ys, -1)
+    crossing = (ys > y) != (ys2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = xs + (y - ys) * (xs2 - xs) / (ys2 - ys)
+    return np.count_nonzero(crossing & (x < x_cross)) % 2 == 1
+
+
+def glyph_outlines_from_object(
+    obj: Object, depsgraph, resolution: int
+) -> list[GlyphOutline]:
+    """
+    文字オブジェクトの輪郭を折れ線にする
+    ほかの輪郭に奇数回囲まれている輪郭は穴として扱う
+    """
+    cache = glyph_cache.get_outline_cache()
+    key = glyph_cache.glyph_key(obj.data)
+    if key is not None:
+        key = (*key, resolution)
+        outlines = cache.get(key)
+        if outlines is not None:
+            return outlines
+
+    loops = [
+        sample_spline(spline, resolution)
+        for spline in glyph_splines_from_object(obj, depsgraph)
+    ]
+    loops = [loop for loop in loops if len(loop) >= 3]
+    outlines = []
+    for i, loop in enumerate(loops):
+        depth = sum(
+            point_in_polygon(loop[0], other) for j, other in enumerate(loops) if i != j
+        )
+        outlines.append(GlyphOutline(loop, depth % 2 == 1))
+    if key is not None:
+        cache.put(key, outlines)
+    return outlines
+
+
+def new_gpencil_material(name: str, holdout: bool = False):
+    """塗りだけのgpencil用マテリアルを作る holdoutは下のストロークを抜く"""
+    material = bpy.data.materials.new(name)
+    # これをしないとgpencil用のマテリアル設定ができない
+    bpy.data.materials.create_gpencil_data(material)
+    material.grease_pencil.show_fill = True
+    material.grease_pencil.show_stroke = False
+    material.grease_pencil.use_fill_holdout = holdout
+    return material
+
+
+@traced
+def build_gpencil(
+    name: str, placements: list[GlyphPlacement], depsgraph, resolution: int
+):
+    """
+    重複しない文字ごとに一度だけ輪郭を塗りのストロークにして、配置ぶん並べる
+    穴は塗りのあとにholdoutのストロークで描いて抜く
+    """
+    gpencil_data = bpy.data.grease_pencils.new(name)
+    gp_layer = gpencil_data.layers.new("Fill")
+    gp_frame = gp_layer.frames.new(frame_number=0, active=True)
+    new_stroke = gp_frame.strokes.new
+
+    gpencil_data.materials.append(new_gpencil_material(name))
+    gpencil_data.materials.append(new_gpencil_material(f"{name}.hole", True))
+
+    for placement in placements:
+        outlines = glyph_outlines_from_object(placement.obj, depsgraph, resolution)
+        # 塗り -> 穴の順に描く
+        outlines = sorted(outlines, key=lambda outline: outline.is_hole)
+        for matrix in placement.matrices:
+            rotation_scale = matrix[:3, :3].T
+            translation = matrix[:3, 3]
+            for outline in outlines:
+                points = outline.points @ rotation_scale + translation
+                # strokeをきれいに閉じるために最初の点をもう一度入れる
+                points = np.concatenate([points, points[:1]]).astype(np.float32)
+                stroke = new_stroke()
+                stroke.points.add(len(points))
+                stroke.points.foreach_set("co", points.ravel())
+                stroke.material_index = 1 if outline.is_hole else 0
+                # fill形状が壊れるので内部面情報を更新する
+                stroke.points.update()
+    return gpencil_data
@@ -0,0 +1,131 @@
+# 文字ごとのメッシュの配列をキャッシュするところ
+# (フォントの内容のハッシュ, 文字, 細分化数) -> GlyphMesh
+from collections import OrderedDict
+import os
+import tempfile
+from logging import getLogger
+from typing import NamedTuple
+import numpy as np
+from bpy.types import TextCurve
+from .hint_cache import font_hash, get_cache_dir
+
+logger = getLogger(__name__)
+
+MAX_ENTRIES = 4096  # メモリに置いておく文字数
+CACHE_DIR_NAME = "glyph_meshes"
+
+_cache = None
+_outline_cache = None
+
+
+class GlyphMesh(NamedTuple):
+    """文字1つぶんの三角形分割済みメッシュの配列"""
+
+    co: np.ndarray  # (V, 3) float32
+    loop_vertex: np.ndarray  # (L,) int32
+    loop_start: np.ndarray  # (P,) int32
+    loop_total: np.ndarray  # (P,) int32
+
+
+def glyph_key(data: TextCurve):
+    """font.characterのTextCurveからキャッシュのキーを作る フォントが読めないときはNone"""
+    try:
+        return (font_hash(data.font), data.body, data.resolution_u)
+    except OSError:
+        return None
+
+
+class GlyphMeshCache:
+    """
+    文字ごとのメッシュなどの配列をメモリに置いておく 件数が上限を超えたら使われていない順に消す
+    directoryを渡すと.npzでディスクにも保存して、別のファイルやセッションでも使う
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, directory: str = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key) -> str:
+        font, character, resolution = key
+        return os.path.join(
+            self.directory, font, f"{resolution}_{ord(character):x}.npz"
+        )
+
+    def get(self, key):
+        """キャッシュにあればGlyphMeshを返す なければNone"""
+        glyph = self.entries.get(key)
+        if glyph is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return glyph
+        if self.directory is not None:
+            glyph = self.load(key)
+            if glyph is not None:
+                self.hits += 1
+                self.put(key, glyph, save=False)
+                return glyph
+        self.misses += 1
+        return None
+
+    def put(self, key, glyph, save: bool = True):
+        self.entries[key] = glyph
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if save and self.directory is not None:
+            self.save(key, glyph)
+
+    def load(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as f:
+                return GlyphMesh(*(f[name] for name in GlyphMesh._fields))
+        except (OSError, ValueError, KeyError):
+            logger.info("broken glyph cache: %s", path)
+            return None
+
+    def save(self, key, glyph):
+        """一時ファイルに書いてから置き換える 複数のblenderから書き込まれても壊れないように"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **glyph._asdict())
+        os.replace(temp_path, path)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def get_cache() -> GlyphMeshCache:
+    """共有のキャッシュを返す"""
+    global _cache
+    if _cache is None:
+        _cache = GlyphMeshCache()
+    return _cache
+
+
+def get_outline_cache() -> GlyphMeshCache:
+    """gpencil用の文字の輪郭の共有キャッシュを返す メモリだけに置く"""
+    global _outline_cache
+    if _outline_cache is None:
+        _outline_cache = GlyphMeshCache()
+    return _outline_cache
+
+
+def set_persistent(enabled: bool, directory: str = None):
+    """共有のキャッシュをディスクにも保存するかどうか"""
+    cache = get_cache()
+    if enabled:
+        if directory is None:
+            directory = os.path.join(get_cache_dir(), CACHE_DIR_NAME)
+        cache.directory = directory
+    else:
+        cache.directory = None
@@ -0,0 +1,179 @@
+# カーニングヒントをフォントごとにディスクへキャッシュするところ
+# {フォントの内容のハッシュ, 文字, 細分化数} -> BoundBoxHeight
+import hashlib
+import os
+import sqlite3
+import time
+from logging import getLogger
+import bpy
+from bpy.types import VectorFont
+
+logger = getLogger(__name__)
+
+CACHE_DIR_NAME = "tategaki_text"
+CACHE_FILE_NAME = "kerning_hints.sqlite3"
+MAX_ENTRIES = 200000  # これを超えたら古いものから消す
+
+# (path, mtime, size) -> hash ファイルを読み直さないようにしておく
+_font_hashes: dict[tuple, str] = {}
+_cache = None
+
+
+def get_cache_dir() -> str:
+    """アドオンのユーザー設定ディレクトリを返す"""
+    return bpy.utils.user_resource("CONFIG", path=CACHE_DIR_NAME, create=True)
+
+
+def font_hash(font: VectorFont) -> str:
+    """フォントファイルの内容からハッシュを求める 同じフォントなら名前が違っても同じになる"""
+    if font.packed_file is not None:
+        key = (font.name, font.packed_file.size)
+        if key not in _font_hashes:
+            data = bytes(font.packed_file.data)
+            _font_hashes[key] = hashlib.sha1(data).hexdigest()
+        return _font_hashes[key]
+
+    if font.filepath == "<builtin>":
+        return "builtin"
+
+    path = bpy.path.abspath(font.filepath)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime, stat.st_size)
+    if key not in _font_hashes:
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        _font_hashes[key] = sha1.hexdigest()
+    return _font_hashes[key]
+
+
+def jis_x_0208_characters() -> str:
+    """JIS X 0208の文字を全部返す"""
+    characters = []
+    for row in range(0x21, 0x7F):
+        for cell in range(0x21, 0x7F):
+            try:
+                characters.append(bytes((row | 0x80, cell | 0x80)).decode("euc_jp"))
+            except UnicodeDecodeError:
+                pass
+    return "".join(characters)
+
+
+def charset_characters(charset: str) -> str:
+    """キャッシュを温める文字集合"""
+    if charset == "JIS_X_0208":
+        return jis_x_0208_characters()
+    elif charset == "KANA":
+        hiragana = "".join(chr(c) for c in range(0x3041, 0x3097))
+        katakana = "".join(chr(c) for c in range(0x30A1, 0x30FB))
+        return hiragana + katakana + "ー、。「」『』（）・…！？　"
+    elif charset == "ASCII":
+        return "".join(chr(c) for c in range(0x20, 0x7F))
+    else:
+        raise ValueError(f"charset='{charset}' is invalid")
+
+
+class KerningHintCache:
+    """sqliteでカーニングヒントを保存する 件数が上限を超えたら使われていない順に消す"""
+
+    def __init__(self, path: str = None, max_entries: int = MAX_ENTRIES):
+        if path is None:
+            path = os.path.join(get_cache_dir(), CACHE_FILE_NAME)
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # 複数のblenderから同時に書き込まれることがあるので待つ
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS hints ("
+                " font TEXT, character TEXT, resolution INTEGER,"
+                " max REAL, min REAL, used REAL,"
+                " PRIMARY KEY (font, character, resolution))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS hints_used ON hints (used)"
+            )
+        return self._connection
+
+    def get_many(self, font: str, characters, resolution: int) -> dict:
+        """キャッシュにある文字のヒントを返す {character: BoundBoxHeight}"""
+        characters = list(set(characters))
+        result = {}
+        con = self.connection
+        # sqliteの変数の上限に引っかからないように分割する
+        for i in range(0, len(characters), 500):
+            chunk = characters[i : i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = con.execute(
+                "SELECT character, max, min FROM hints"
+                f" WHERE font = ? AND resolution = ? AND character IN ({placeholders})",
+                [font, resolution, *chunk],
+            ).fetchall()
+            result.update({c: {"max": mx, "min": mn} for c, mx, mn in rows})
+        if len(result) != 0:
+            now = time.time()
+            with con:
+                con.executemany(
+                    "UPDATE hints SET used = ?"
+                    " WHERE font = ? AND character = ? AND resolution = ?",
+                    [(now, font, c, resolution) for c in result],
+                )
+        return result
+
+    def set_many(self, font: str, hints: dict, resolution: int):
+        """{character: BoundBoxHeight}を保存する"""
+        if len(hints) == 0:
+            return
+        now = time.time()
+        con = self.connection
+        with con:
+            con.executemany(
+                "INSERT OR REPLACE INTO hints VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (font, c, resolution, hint["max"], hint["min"], now)
+                    for c, hint in hints.items()
+                ],
+            )
+        self.evict()
+
+    def evict(self):
+        """上限を超えた分を古いものから消す"""
+        con = self.connection
+        (count,) = con.execute("SELECT COUNT(*) FROM hints").fetchone()
+        over = count - self.max_entries
+        if over > 0:
+            with con:
+                con.execute(
+                    "DELETE FROM hints WHERE rowid IN"
+                    " (SELECT rowid FROM hints ORDER BY used LIMIT ?)",
+                    (over,),
+                )
+            logger.debug("evicted %d kerning hints", over)
+
+    def clear(self):
+        with self.connection as con:
+            con.execute("DELETE FROM hints")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def get_cache() -> KerningHintCache:
+    """共有のキャッシュを返す"""
+    global _cache
+    if _cache is None:
+        _cache = KerningHintCache()
+    return _cache
+
+
+def set_cache(cache: KerningHintCache):
+    """共有のキャッシュを差し替える ベンチマークで別のファイルを使うときなど"""
+    global _cache
+    _cache = cache
@@ -0,0 +1,108 @@
+# 縦書きテキストの文字配置をまとめて計算するところ
+# bpyに依存しないのでblenderの外でも動く
+import math
+from typing import Sequence
+import numpy as np
+
+# 文字のタイプ
+NORMAL = 0
+UPPER_RIGHT = 1  # 句読点 右上に寄せる
+ROTATION = 2  # 括弧など 90度回転する
+BLANK = 3  # 空白
+
+UPPER_RIGHT_CHARACTERS = "、。,."
+ROTATION_CHARACTERS = "[]()（）<>＜＞「」【】『』〈〉《》«»［］｛｝{}-ー―=＝~〜…"
+BLANK_CHARACTERS = " 　"
+
+_type_table: dict[str, int] = {}
+_type_table.update({c: UPPER_RIGHT for c in UPPER_RIGHT_CHARACTERS})
+_type_table.update({c: ROTATION for c in ROTATION_CHARACTERS})
+_type_table.update({c: BLANK for c in BLANK_CHARACTERS})
+
+
+def classify(characters: Sequence[str]) -> np.ndarray:
+    """文字ごとのタイプの配列を返す"""
+    get = _type_table.get
+    return np.fromiter(
+        (get(c, NORMAL) for c in characters), dtype=np.int8, count=len(characters)
+    )
+
+
+def grid_numbers(line_lengths: Sequence[int]):
+    """
+    行ごとの文字数から文字ごとの行番号と行内の番号を求める
+    :return (line_numbers, chr_numbers)
+    """
+    lengths = np.asarray(line_lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    line_numbers = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    chr_numbers = np.arange(total) - np.repeat(starts, lengths)
+    return line_numbers, chr_numbers
+
+
+def calc_auto_kerning(
+    chr_numbers: np.ndarray,
+    str_types: np.ndarray,
+    hint_max: np.ndarray,
+    hint_min: np.ndarray,
+    margin: float,
+    blank_size: float,
+) -> np.ndarray:
+    """
+    一つ前の文字の下端に詰めたy座標を行ごとの累積和で求める
+    y[i] = y[i-1] + min[i-1] - top[i] - margin
+    """
+    first = chr_numbers == 0
+    top = np.where(str_types == BLANK, blank_size, hint_max)
+    step = -top
+    # 行頭以外は一つ前の文字の下端とマージンを足す
+    previous_min = np.roll(hint_min, 1)
+    step = step + np.where(first, 0.0, previous_min - margin)
+    cumulative = np.cumsum(step)
+    # 行頭までの累積を引いて行ごとの累積和にする
+    line_starts = np.arange(len(chr_numbers)) - chr_numbers
+    return cumulative - cumulative[line_starts] + step[line_starts]
+
+
+def calc_layout(
+    line_numbers: np.ndarray,
+    chr_numbers: np.ndarray,
+    str_types: np.ndarray,
+    line_spacing: float,
+    chr_spacing: float,
+    blank_size: float = 0.5,
+    auto_kerning: bool = False,
+    hint_max: Sequence[float] = None,
+    hint_min: Sequence[float] = None,
+    offsets: Sequence[Sequence[float]] = None,
+):
+    """
+    全文字の座標と回転をまとめて求める
+    line_spacingに0を渡すと行コンテナ基準の座標になる
+    :return (locations Nx3, rotations N) rotationsはz軸回転(radian)
+    """
+    count = len(chr_numbers)
+    chr_numbers = np.asarray(chr_numbers)
+    locations = np.zeros((count, 3), dtype=np.float64)
+    locations[:, 0] = -line_spacing * np.asarray(line_numbers, dtype=np.float64)
+
+    upper_right = str_types == UPPER_RIGHT
+    if offsets is not None:
+        offsets = np.asarray(offsets, dtype=np.float64).reshape(count, 3)
+        locations[upper_right] += offsets[upper_right]
+
+    if auto_kerning:
+        locations[:, 1] = calc_auto_kerning(
+            chr_numbers,
+            str_types,
+            np.asarray(hint_max, dtype=np.float64),
+            np.asarray(hint_min, dtype=np.float64),
+            chr_spacing,
+            blank_size,
+        )
+    else:
+        locations[:, 1] += -chr_spacing * np.asarray(chr_numbers, dtype=np.float64)
+
+    rotations = np.where(str_types == ROTATION, math.radians(-90), 0.0)
+    return locations, rotations
@@ -0,0 +1,35 @@
+# モジュールを最初に使うときまで読み込まないところ
+# アドオンを有効にするときにnumpyやレイアウト、変換のモジュールを読み込まないようにする
+#   layout = lazy_import(f"{__package__}.layout")
+#   layout.calc_layout(...)  # ここで初めて読み込まれる
+import importlib.util
+import sys
+import types
+
+
+def lazy_import(name: str):
+    """
+    属性に最初にアクセスしたときに読み込まれるモジュールを返す
+    読み込み済みならreloadしてから返す 有効化し直したときやF8で変更を反映するため
+    まだ読み込まれていなければ、最初のアクセスで今のコードが読み込まれる
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        if is_loaded(module):
+            importlib.reload(module)
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_loaded(module) -> bool:
+    """lazy_importしたモジュールがもう読み込まれたか 読み込みはしない"""
+    # 読み込まれるとクラスがModuleTypeに戻る
+    return type(module) is types.ModuleType
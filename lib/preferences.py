@@ -0,0 +1,153 @@
+# アドオンの設定 ログのレベルと書き出し先を決める
+# 既定ではファイルに何も書かない(読み取り専用のアドオンのディレクトリやレンダーノード向け)
+# 環境変数 TATEGAKI_LOG_LEVEL, TATEGAKI_LOG_FILE で設定より優先して指定できる
+import os
+from logging import getLogger, StreamHandler, Formatter, handlers
+import bpy
+
+ADDON_NAME = __package__.rpartition(".")[0]  # アドオンのパッケージ名
+STREAM_HANDLER = "tategaki_stream"
+FILE_HANDLER = "tategaki_file"
+LOG_FILE_NAME = "tategaki.log"
+
+logger = getLogger(__name__)
+
+LEVEL_ITEMS = [
+    ("DEBUG", "Debug", ""),
+    ("INFO", "Info", ""),
+    ("WARNING", "Warning", ""),
+    ("ERROR", "Error", ""),
+]
+
+
+def default_log_path() -> str:
+    """ユーザー設定ディレクトリのログファイル アドオンのディレクトリには書かない"""
+    directory = bpy.utils.user_resource("CONFIG", path="tategaki_text")
+    return os.path.join(directory, "log", LOG_FILE_NAME)
+
+
+class DelayedFileHandler(handlers.RotatingFileHandler):
+    """最初に書き込むときにディレクトリとファイルを作る 登録のときはディスクに触らない"""
+
+    def __init__(self, path: str):
+        super().__init__(
+            path, maxBytes=500000, backupCount=2, encoding="utf-8", delay=True
+        )
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def remove_handler(root_logger, name: str):
+    """名前のついたハンドラを外す リロードしても重複しないように名前で探す"""
+    for handler in list(root_logger.handlers):
+        if handler.get_name() == name:
+            root_logger.removeHandler(handler)
+            handler.close()
+
+
+def configure_logging(level: str = "WARNING", path: str = None):
+    """アドオンのロガーのレベルと出力先を設定する pathがNoneならファイルに書かない"""
+    root_logger = getLogger(ADDON_NAME)
+    root_logger.setLevel(level)
+    remove_handler(root_logger, STREAM_HANDLER)
+    remove_handler(root_logger, FILE_HANDLER)
+
+    sh = StreamHandler()
+    sh.set_name(STREAM_HANDLER)
+    sh.setLevel(level)
+    sh.setFormatter(Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    root_logger.addHandler(sh)
+
+    if path is not None:
+        fh = DelayedFileHandler(path)
+        fh.set_name(FILE_HANDLER)
+        fh.setLevel(level)
+        fh.setFormatter(
+            Formatter(
+                "%(asctime)s - %(filename)s - %(name)s"
+                " - %(lineno)d - %(levelname)s - %(message)s"
+            )
+        )
+        root_logger.addHandler(fh)
+
+
+def get_preferences():
+    addon = bpy.context.preferences.addons.get(ADDON_NAME)
+    return None if addon is None else addon.preferences
+
+
+def apply_preferences(_self=None, _context=None):
+    """設定と環境変数からログを設定し直す 設定のupdateからも呼ぶ"""
+    prefs = get_preferences()
+    level = "WARNING"
+    path = None
+    if prefs is not None:
+        level = prefs.log_level
+        if prefs.log_to_file:
+            path = default_log_path()
+            if prefs.log_file != "":
+                path = bpy.path.abspath(prefs.log_file)
+    env_level = os.environ.get("TATEGAKI_LOG_LEVEL", level).upper()
+    path = os.environ.get("TATEGAKI_LOG_FILE", path)
+    # 知らないレベルでsetLevelするとValueErrorで有効にできなくなるので設定の値を使う
+    valid = env_level in (name for name, _label, _description in LEVEL_ITEMS)
+    configure_logging(env_level if valid else level, path)
+    if not valid:
+        logger.warning(
+            "TATEGAKI_LOG_LEVEL='%s' is invalid. Using '%s'",
+            os.environ["TATEGAKI_LOG_LEVEL"],
+            level,
+        )
+
+
+class TATEGAKI_Preferences(bpy.types.AddonPreferences):
+    bl_idname = ADDON_NAME
+
+    log_level: bpy.props.EnumProperty(
+        name="log level",
+        default="WARNING",
+        items=LEVEL_ITEMS,
+        update=apply_preferences,
+    )
+
+    log_to_file: bpy.props.BoolProperty(
+        name="log to file",
+        description="Write logs to a file. When off, nothing is written to disk",
+        default=False,
+        update=apply_preferences,
+    )
+
+    # 空のときはユーザー設定ディレクトリに書く
+    log_file: bpy.props.StringProperty(
+        name="log file",
+        subtype="FILE_PATH",
+        default="",
+        update=apply_preferences,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "log_level")
+        layout.prop(self, "log_to_file")
+        row = layout.row()
+        row.enabled = self.log_to_file
+        row.prop(self, "log_file")
+
+
+classses = [TATEGAKI_Preferences]
+
+
+def register():
+    for c in classses:
+        bpy.utils.register_class(c)
+    apply_preferences()
+
+
+def unregister():
+    for c in classses:
+        bpy.utils.unregister_class(c)
+    root_logger = getLogger(ADDON_NAME)
+    remove_handler(root_logger, STREAM_HANDLER)
+    remove_handler(root_logger, FILE_HANDLER)
@@ -0,0 +1,207 @@
+# マニフェストを分けて複数のblender -bでまとめて作るところ
+# blender -b -P <addon>/cli.py -- shard manifest.json --workers 16 --output out.blend
+# bpyはプロセスごとに1スレッドなので、itemをワーカーのプロセスに分けて並列に作り、
+# 結果の.blendをこのプロセスでappendして1つのファイルにまとめる
+# 文字ごとのメッシュのキャッシュはディスクに置いてワーカーで共有する
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+import bpy
+from . import batch
+from .tategaki import TategakiTextUtil
+
+logger = getLogger(__name__)
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cli.py")
+
+
+def split_items(items: list[dict], count: int) -> list[list[dict]]:
+    """文字数が偏らないように、文字数の多い順に一番空いているシャードへ入れる"""
+    shards: list[list[dict]] = [[] for _ in range(count)]
+    loads = [0] * count
+    for item in sorted(items, key=lambda item: len(item["text"]), reverse=True):
+        index = loads.index(min(loads))
+        shards[index].append(item)
+        loads[index] += len(item["text"]) + 1
+    return [shard for shard in shards if len(shard) != 0]
+
+
+def worker_command(manifest_path: str, output: str, report: str, options) -> list:
+    """ワーカーのblenderのコマンド アドオンはcli.pyが登録するので設定は読まない"""
+    return [
+        bpy.app.binary_path,
+        "-b",
+        "--factory-startup",
+        "-noaudio",
+        "-t",
+        str(options.threads),
+        "-P",
+        CLI_PATH,
+        "--",
+        manifest_path,
+        "--output",
+        output,
+        "--report",
+        report,
+        "--disk-cache",
+        "--cache-dir",
+        options.cache_dir,
+    ]
+
+
+def run_shard(index: int, items: list[dict], manifest: dict, options) -> dict:
+    """
+    シャードをワーカーで作る 失敗したitemだけretriesの回数までやり直す
+    :return シャードのレポート outputsは結果の.blendのリスト
+    """
+    pending = items
+    outputs = []
+    reports: dict[str, dict] = {}
+    attempts = 0
+    start = time.perf_counter()
+    while len(pending) != 0 and attempts <= options.retries:
+        name = os.path.join(options.work_dir, f"shard_{index:03d}.{attempts}")
+        # defaultsはresolve_itemsで埋めてあるので、ワーカーではそのまま使う
+        shard_manifest = {"items": pending, "resolved": True}
+        if manifest.get("export_dir") is not None:
+            shard_manifest["export_dir"] = os.path.abspath(manifest["export_dir"])
+        with open(f"{name}.json", "w", encoding="utf-8") as f:
+            json.dump(shard_manifest, f, ensure_ascii=False)
+        command = worker_command(
+            f"{name}.json", f"{name}.blend", f"{name}.report.json", options
+        )
+        attempts += 1
+        with open(f"{name}.log", "w", encoding="utf-8") as log:
+            process = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+
+        try:
+            with open(f"{name}.report.json", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            # ワーカーが落ちたときはレポートがないので全部やり直す
+            logger.info("shard %d crashed: exit code %d", index, process.returncode)
+            continue
+        for item_report in report["items"]:
+            reports[item_report["name"]] = item_report
+        if report["succeeded"] != 0:
+            outputs.append(f"{name}.blend")
+        pending = [item for item in pending if reports[item["name"]]["status"] != "ok"]
+        logger.info("shard %d: attempt %d, failed %d", index, attempts, len(pending))
+
+    for item in pending:
+        reports.setdefault(
+            item["name"], {"name": item["name"], "status": "error", "error": "crashed"}
+        )
+    return {
+        "index": index,
+        "attempts": attempts,
+        "items": [reports[item["name"]] for item in items],
+        "outputs": outputs,
+        "time": time.perf_counter() - start,
+    }
+
+
+def merge_outputs(paths: list[str], output: str) -> int:
+    """
+    シャードの.blendのコレクションをappendして1つの.blendに書き出す
+    フェイクユーザーをつけるのは縦書きテキストのコレクションだけで、
+    .glyphsなどの子のコレクションは親といっしょに書き出される
+    """
+    collections = set()
+    for path in paths:
+        with bpy.data.libraries.load(path) as (data_from, data_to):
+            data_to.collections = data_from.collections
+        children = {child for c in data_to.collections for child in c.children}
+        collections.update(c for c in data_to.collections if c not in children)
+    bpy.data.libraries.write(os.path.abspath(output), collections, fake_user=True)
+    return len(collections)
+
+
+def parse_args(argv: list[str]):
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(
+        prog="blender -b -P cli.py -- shard",
+        description="Create vertical texts from a manifest with worker processes",
+    )
+    parser.add_argument("manifest", help="json or csv manifest")
+    parser.add_argument("--output", required=True, help=".blend file to write")
+    parser.add_argument("--report", help="json file to write the report")
+    parser.add_argument("--workers", type=int, default=cpu_count)
+    parser.add_argument("--threads", type=int, default=0, help="threads per worker")
+    parser.add_argument("--retries", type=int, default=1, help="retries per shard")
+    parser.add_argument("--work-dir", help="directory for shard files")
+    parser.add_argument("--cache-dir", help="shared glyph mesh cache directory")
+    args = parser.parse_args(argv)
+    if args.threads == 0:
+        args.threads = max(1, cpu_count // args.workers)
+    return args
+
+
+def main(argv: list[str]) -> int:
+    """:return 失敗したitemがあれば1"""
+    start = time.perf_counter()
+    options = parse_args(argv)
+    manifest = batch.load_manifest(options.manifest)
+    # ワーカーごとに名前を振るとぶつかるので先に決めておく
+    items = batch.resolve_items(manifest)
+    if options.work_dir is None:
+        options.work_dir = tempfile.mkdtemp(prefix="tategaki_shard_")
+    options.work_dir = os.path.abspath(options.work_dir)
+    os.makedirs(options.work_dir, exist_ok=True)
+    if options.cache_dir is None:
+        options.cache_dir = manifest.get("cache_dir") or os.path.join(
+            batch.hint_cache.get_cache_dir(), batch.glyph_cache.CACHE_DIR_NAME
+        )
+
+    # カーニングヒントのキャッシュはワーカーが同じ文字を測らないように先に温める
+    warm_time = 0.0
+    if manifest.get("warm_charset"):
+        warm_start = time.perf_counter()
+        batch.warm_caches(TategakiTextUtil(), items, manifest["warm_charset"])
+        warm_time = time.perf_counter() - warm_start
+
+    shards = split_items(items, options.workers)
+    logger.info("%d items, %d shards in %s", len(items), len(shards), options.work_dir)
+    workers_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+        futures = [
+            executor.submit(run_shard, i, shard, manifest, options)
+            for i, shard in enumerate(shards)
+        ]
+        shard_reports = [future.result() for future in futures]
+    workers_time = time.perf_counter() - workers_start
+
+    merge_start = time.perf_counter()
+    outputs = [path for report in shard_reports for path in report["outputs"]]
+    merged = merge_outputs(outputs, options.output)
+    merge_time = time.perf_counter() - merge_start
+
+    item_reports = [item for report in shard_reports for item in report["items"]]
+    report = {
+        "blender": bpy.app.version_string,
+        "workers": len(shards),
+        "shards": [
+            {key: value for key, value in shard.items() if key != "items"}
+            for shard in shard_reports
+        ],
+        "items": item_reports,
+        "succeeded": sum(item["status"] == "ok" for item in item_reports),
+        "failed": sum(item["status"] != "ok" for item in item_reports),
+        "characters": sum(item.get("characters", 0) for item in item_reports),
+        "collections": merged,
+        "timings": {
+            "warm": warm_time,
+            "workers": workers_time,
+            "merge": merge_time,
+            "total": time.perf_counter() - start,
+        },
+        "output": options.output,
+        "work_dir": options.work_dir,
+    }
+    batch.write_report(report, options.report)
+    return 0 if report["failed"] == 0 else 1
@@ -0,0 +1,161 @@
+# 縦書きテキストのstateをコンテナのid-propに小さく保存するところ
+# version 2:
+#   text_props -> {"line_count", "text", "format_runs"} 文字列は1つにまとめ、フォーマットはランレングス
+#     メモリの上ではcharacters.CharacterArrayで持つ
+#   punctuation_offsets -> {"names", 値の配列} 名前はTextCurveの名前を改行でつないだ文字列
+#     名前は.001がついたり切り詰められたりするので、フォント名と文字に分けずにそのまま持つ
+#   body, body_object_name_list, kerning_hints -> 保存しない(bodyはtext_propsから求める)
+from logging import getLogger
+from .characters import CharacterArray
+
+logger = getLogger(__name__)
+
+STATE_VERSION = 2
+VERSION_KEY = "version"
+
+# 保存しないフィールド
+# カーニングヒントはfont.characterのTextCurveに登録するのでstateには持たない
+DERIVED_FIELDS = ("body", "body_object_name_list", "kerning_hints")
+
+
+def run_length_encode(values: list[int]) -> list[int]:
+    """[count, value, count, value, ...]にする"""
+    runs = []
+    for value in values:
+        if len(runs) != 0 and runs[-1] == value:
+            runs[-2] += 1
+        else:
+            runs.extend((1, value))
+    return runs
+
+
+def run_length_decode(runs) -> list[int]:
+    values = []
+    for i in range(0, len(runs), 2):
+        values.extend([runs[i + 1]] * runs[i])
+    return values
+
+
+def encode_text_props(characters: CharacterArray) -> dict:
+    """文字の配列は段落を改行でつないだ文字列に、フォーマットはランレングスにする"""
+    return {
+        "line_count": characters.paragraph_count,
+        "text": "\n".join(characters.paragraphs()),
+        "format_runs": run_length_encode(characters.formats),
+    }
+
+
+def decode_lines(encoded) -> list[str]:
+    """行ごとの文字列 空の本文と空行1つを区別するために行数を使う"""
+    if encoded["line_count"] == 0:
+        return []
+    return encoded["text"].split("\n")
+
+
+def decode_text_props(encoded) -> CharacterArray:
+    formats = run_length_decode(list(encoded["format_runs"]))
+    return CharacterArray.from_paragraphs(decode_lines(encoded), formats)
+
+
+def paragraph_lengths(encoded) -> list[int]:
+    """改行で分けた行ごとの文字数 フォーマットは復号しない"""
+    return [len(line) for line in decode_lines(encoded)]
+
+
+def encode_glyph_table(table: dict, to_values) -> dict:
+    """
+    {TextCurveの名前: value}を{"names", "values"}にまとめる
+    to_valuesはvalueを数値のリストにする関数
+    """
+    values = []
+    for value in table.values():
+        values.extend(to_values(value))
+    return {"names": "\n".join(table.keys()), "values": values}
+
+
+def decode_glyph_table(encoded, size: int, from_values) -> dict:
+    if len(encoded["names"]) == 0:
+        return {}
+    values = list(encoded["values"])
+    return {
+        name: from_values(values[i * size : i * size + size])
+        for i, name in enumerate(encoded["names"].split("\n"))
+    }
+
+
+def encode_field(key: str, value):
+    """フィールドをid-propに保存する形にする 保存しないフィールドはNone"""
+    if key in DERIVED_FIELDS:
+        return None
+    if key == "text_props":
+        return encode_text_props(value)
+    if key == "punctuation_offsets":
+        return encode_glyph_table(value, list)
+    return value
+
+
+def decode_field(group, key: str):
+    """id-propからフィールドを1つ取り出す ないときはKeyError"""
+    if key == "body":
+        return decode_lines(group["text_props"])
+    if key == "body_object_name_list":
+        return []
+    value = group[key]
+    if key == "text_props":
+        return decode_text_props(value)
+    if key == "punctuation_offsets":
+        return decode_glyph_table(value, 3, list)
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if hasattr(value, "to_list"):
+        return value.to_list()
+    return value
+
+
+def encode_state(state: dict) -> dict:
+    encoded = {VERSION_KEY: STATE_VERSION}
+    for key, value in state.items():
+        value = encode_field(key, value)
+        if value is not None:
+            encoded[key] = value
+    return encoded
+
+
+def is_current(group) -> bool:
+    return group.get(VERSION_KEY) == STATE_VERSION
+
+
+class LazyState(dict):
+    """
+    コンテナのid-propから使うフィールドだけ復号するstate
+    読んだか書き換えたフィールドだけdictに入るので、保存もそれだけ書き込めばいい
+    """
+
+    def __init__(self, group):
+        super().__init__()
+        self.group = group
+
+    def __missing__(self, key):
+        if key == "body" and self.loaded("text_props"):
+            # 書き換えたtext_propsがあればそちらから求める
+            value = self["text_props"].paragraphs()
+        else:
+            value = decode_field(self.group, key)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def loaded(self, key: str) -> bool:
+        return dict.__contains__(self, key)
+
+    def load_all(self):
+        """全部のフィールドを復号する 別のコンテナに保存するときに使う"""
+        for key in self.group.keys():
+            if key != VERSION_KEY:
+                self[key]
+        return self
@@ -2,33 +2,43 @@ import math
 import bpy
 from bpy.types import (
     Context,
-    Curve,
     Material,
     TextCurve,
     Object,
     VectorFont,
-    TextCharacterFormat,
-    DecimateModifier,
-    EdgeSplitModifier,
 )
 import mathutils
 from logging import getLogger
-from .util import (
-    random_name,
-    timer,
-    mesh_transform_apply,
-    convert_to_mesh,
-    mesh_to_gpencil,
-)
+from .trace import traced
+from . import trace
+from .lazy import lazy_import
+from . import state_codec
+from . import characters
+from .characters import CharacterArray
+from . import footprint
+import json
 import os
 import pprint
 from typing import TypedDict, Final
 import re
+import difflib
+import time
+from bisect import bisect_left
+from itertools import accumulate
 
 # setup
 logger = getLogger(__name__)
 translation = bpy.app.translations.pgettext
 
+# numpyを使うモジュールやフォントを読むモジュールは最初にオペレーターを使うときに読み込む
+# アドオンを有効にするときはbpyと軽いモジュールだけ読み込む
+util = lazy_import(f"{__package__}.util")
+layout = lazy_import(f"{__package__}.layout")
+hint_cache = lazy_import(f"{__package__}.hint_cache")
+freeze = lazy_import(f"{__package__}.freeze")
+glyph_cache = lazy_import(f"{__package__}.glyph_cache")
+
+
 # utils
 # https://dlrecord.hatenablog.com/entry/2020/07/30/230234
 def atoi(text: str):
@@ -62,6 +72,9 @@ def load_fonts():
 # types
 TATEGAKI: Final[str] = "tategaki"
 TATEGAKI_CHR: Final[str] = "tategaki_chr"
+PUNCTUATION_OFFSET: Final[str] = "tategaki_punctuation_offset"  # TextCurveに保存する
+KERNING_HINT: Final[str] = "tategaki_kerning_hint"  # TextCurveに細分化数ごとに保存する
+OWNED: Final[str] = "tategaki_owned"  # アドオンが作ったデータブロックの印 削除するときに使う
 Objects = list[Object]
 
 
@@ -70,16 +83,6 @@ class BoundBoxHeight(TypedDict):
     min: float
 
 
-class CharacterProp(TypedDict):
-    """1文字単位のプロパティ"""
-
-    character: str
-    material_index: int
-    use_bold: bool
-    use_italic: bool
-    use_small_caps: bool
-
-
 class TategakiState(TypedDict):
     """
     縦書きテキストの状態を保存するやつ
@@ -91,10 +94,8 @@ class TategakiState(TypedDict):
     tag: str  # 何かしらに使う識別子
     resolution: int  # テキストカーブの細分化数
     body: list[str]  # 改行で分割された文字列のリスト
-    text_props: list
-    body_object_name_list: list[list[str]]
+    text_props: CharacterArray  # 文字とフォーマットと段落の配列
     limit_length: int  # 行文字数制限
-    kerning_hints: dict[str, BoundBoxHeight]
     line_spacing: float  # 行間
     chr_spacing: float  # 字間
     blank_size: float  # 空白文字の大きさ
@@ -105,6 +106,16 @@ class TategakiState(TypedDict):
     font_bold: VectorFont
     font_italic: VectorFont
     font_bold_italic: VectorFont
+    backend: str  # "OBJECTS": 1文字1オブジェクト "INSTANCES": 点群からインスタンス
+    instancer: str  # INSTANCESのときの点群オブジェクトの名前
+    glyph_collection: str  # INSTANCESのときにインスタンスする文字オブジェクトのコレクション名
+    punctuation_offsets: dict[str, list[float]]  # 句読点の位置オフセット keyはfont.character
+
+
+class TategakiObjectRef(bpy.types.PropertyGroup):
+    """文字の番号から文字オブジェクトへの参照 名前が変わっても追える"""
+
+    object: bpy.props.PointerProperty(type=Object)
 
 
 # /types
@@ -113,16 +124,18 @@ class TategakiState(TypedDict):
 class TategakiTextUtil:
     """縦書きテキスト用のutilとかをまとめておく"""
 
+    evaluated = False  # オブジェクトを作ってからupdate済みかどうか
+
     """utilities"""
 
     @staticmethod
     def decision_special_character(single_str: str):
         """特殊文字の判定　文字のタイプを判定して返す"""
-        if single_str in "、。,.":
+        if single_str in layout.UPPER_RIGHT_CHARACTERS:
             return "upper_right"
-        elif single_str in "[]()（）<>＜＞「」【】『』〈〉《》«»［］｛｝{}-ー―=＝~〜…":
+        elif single_str in layout.ROTATION_CHARACTERS:
             return "rotation"
-        elif single_str in " 　":
+        elif single_str in layout.BLANK_CHARACTERS:
             return "blank"
         else:
             return "normal"
@@ -145,6 +158,7 @@ class TategakiTextUtil:
         data = bpy.data.curves.get(name)
         if data is None:
             data = bpy.data.curves.new(name, "FONT")
+            data[OWNED] = True
             data.body = chr
             data.align_y = "CENTER"
             data.align_x = "CENTER"
@@ -152,6 +166,7 @@ class TategakiTextUtil:
             material = bpy.data.materials.get("Material")
             if material is None:
                 material = bpy.data.materials.new("Material")
+                material[OWNED] = True
             data.materials.append(material)
         return data
 
@@ -192,6 +207,17 @@ class TategakiTextUtil:
         result = BoundBoxHeight(max=max(xyz[Y]), min=min(xyz[Y]))
         return result
 
+    @staticmethod
+    def calc_rotated_bound_box_height(bound_box):
+        """
+        z軸で-90度回転したときのbound_boxの高さを回転前のbound_boxから求める
+        (x, y) -> (y, -x) なので回転後のyの範囲は回転前の-xの範囲
+        """
+        X = 0
+        xs = [v[X] for v in bound_box]
+        result = BoundBoxHeight(max=-min(xs), min=-max(xs))
+        return result
+
     @staticmethod
     def calc_punctuation_offset(bound_box_center: list):
         """句読点の位置オフセットを求める"""
@@ -199,215 +225,497 @@ class TategakiTextUtil:
         return offset
 
     @staticmethod
-    def gen_character_prop(character: str, textfromat: TextCharacterFormat):
-        """フォーマットからプロパティを取り出す"""
-        prop = CharacterProp(
-            character=character,
-            material_index=textfromat.material_index,
-            use_bold=textfromat.use_bold,
-            use_italic=textfromat.use_italic,
-            use_small_caps=textfromat.use_small_caps,
-        )
-        return prop
-
-    def text_to_props(self, text_object: Object):
-        """テキストから文字単位のpropのリストを生成して返す"""
+    def text_to_props(text_object: Object) -> CharacterArray:
+        """テキストから文字とフォーマットの配列を作る 文字ごとのdictは作らない"""
         data: TextCurve = text_object.data
         body = data.body
         body_format = data.body_format
-        lines = body.splitlines()
+        paragraphs = body.splitlines()
+        formats = []
         index = 0
-        lines_chr_props: list[list[CharacterProp]] = []
-        for line in lines:
-            line_len = len(line)
-            index2 = index + line_len
-            line_format = body_format[index:index2]
-            temp = [self.gen_character_prop(s, f) for s, f in zip(line, line_format)]
-            lines_chr_props.append(temp)
+        for paragraph in paragraphs:
+            line_len = len(paragraph)
+            formats.extend(
+                characters.pack_format(
+                    f.material_index, f.use_bold, f.use_italic, f.use_small_caps
+                )
+                for f in body_format[index : index + line_len]
+            )
             index += line_len + 1
-        return lines_chr_props
-
-    def modify_text_props(self, lines_chr_props: list, limit_length: int):
-        """行文字数制限を適応したpropsを生成"""
-        line: list[CharacterProp]
-        modified_lines_chr_props: list[list[CharacterProp]] = []
-        for line in lines_chr_props:
-            length = len(line)
-            if length > limit_length:
-                splitted = [
-                    line[idx : idx + limit_length]
-                    for idx in range(0, length, limit_length)
-                ]
-                modified_lines_chr_props.extend(splitted)
-            else:
-                modified_lines_chr_props.append(line)
-        return modified_lines_chr_props
+        return CharacterArray.from_paragraphs(paragraphs, formats)
+
+    def get_font_name(self, value: int):
+        """フォーマットから使うフォントの名前を決定する"""
+        bold = characters.is_bold(value)
+        italic = characters.is_italic(value)
+        if bold and italic:
+            return self.state["font_bold_italic"].name
+        elif bold:
+            return self.state["font_bold"].name
+        elif italic:
+            return self.state["font_italic"].name
+        else:
+            return self.state["font"].name
 
-    def character_prop_to_object(self, chr_prop: CharacterProp):
-        """CharacterPropから文字オブジェクトを生成する"""
-        font_name = ""
-        character = chr_prop["character"]
+    def character_to_object(self, character: str, value: int):
+        """文字とフォーマットから文字オブジェクトを生成する"""
         materials = self.state["materials"]
-        material = materials[chr_prop["material_index"]]
-        # 使うフォントを決定する
-        if chr_prop["use_bold"] and chr_prop["use_italic"]:
-            font_name = self.state["font_bold_italic"].name
-        elif chr_prop["use_bold"]:
-            font_name = self.state["font_bold"].name
-        elif chr_prop["use_italic"]:
-            font_name = self.state["font_italic"].name
-        else:
-            font_name = self.state["font"].name
+        material = materials[characters.material_index(value)]
+        font_name = self.get_font_name(value)
 
         chr_data = self.get_chr_data(font_name, character)
         chr_data.resolution_u = self.state["resolution"]
         obj = bpy.data.objects.new(chr_data.name, chr_data)
+        trace.count("objects")
         obj.material_slots[0].link = "OBJECT"
         obj.material_slots[0].material = material
         return obj
 
+    def apply_character(self, obj: Object, character: str, value: int):
+        """既存の文字オブジェクトの文字とマテリアルを文字とフォーマットに合わせて差し替える"""
+        materials = self.state["materials"]
+        font_name = self.get_font_name(value)
+        chr_data = self.get_chr_data(font_name, character)
+        chr_data.resolution_u = self.state["resolution"]
+        obj.data = chr_data
+        obj.material_slots[0].link = "OBJECT"
+        obj.material_slots[0].material = materials[characters.material_index(value)]
+
     @staticmethod
     def get_empty(collection_name: str = "tategaki_pool"):
         collection = bpy.data.collections.get(collection_name)
         if collection is None:
             collection = bpy.data.collections.new(collection_name)
         empty: Object = bpy.data.objects.new("empty", None)
+        trace.count("objects")
         collection.objects.link(empty)
         return empty
 
     @staticmethod
-    def get_empty_mesh_object(collection_name: str = "tategaki_pool"):
-        collection = bpy.data.collections.get(collection_name)
-        if collection is None:
-            collection = bpy.data.collections.new(collection_name)
-        name = random_name(8)
-        mesh = bpy.data.meshes.new(name)
-        obj = bpy.data.objects.new(name, mesh)
-        collection.objects.link(obj)
-        return obj
+    def get_glyph_instancer_node_group(name: str = "tategaki_glyph_instancer"):
+        """
+        点群のglyph_index属性で文字オブジェクトを選んでインスタンスするノードグループを取得（生成）
+        geometry nodesのInstance on Pointsを使うので3.0以降
+        """
+        node_group = bpy.data.node_groups.get(name)
+        if node_group is not None:
+            return node_group
+        node_group = bpy.data.node_groups.new(name, "GeometryNodeTree")
+        node_group[OWNED] = True
+        node_group.inputs.new("NodeSocketGeometry", "Geometry")
+        node_group.inputs.new("NodeSocketCollection", "Glyphs")
+        node_group.inputs.new("NodeSocketInt", "Glyph Index")
+        node_group.outputs.new("NodeSocketGeometry", "Geometry")
+
+        nodes = node_group.nodes
+        links = node_group.links
+        group_input = nodes.new("NodeGroupInput")
+        group_output = nodes.new("NodeGroupOutput")
+        collection_info = nodes.new("GeometryNodeCollectionInfo")
+        collection_info.transform_space = "ORIGINAL"
+        # 子オブジェクトは名前順に並ぶのでglyph_indexと対応させておく
+        collection_info.inputs["Separate Children"].default_value = True
+        # 回転文字はオブジェクトの回転をそのまま使う
+        collection_info.inputs["Reset Children"].default_value = False
+        instance_on_points = nodes.new("GeometryNodeInstanceOnPoints")
+        instance_on_points.inputs["Pick Instance"].default_value = True
+
+        links.new(group_input.outputs["Geometry"], instance_on_points.inputs["Points"])
+        links.new(group_input.outputs["Glyphs"], collection_info.inputs["Collection"])
+        links.new(
+            collection_info.outputs["Geometry"], instance_on_points.inputs["Instance"]
+        )
+        links.new(
+            group_input.outputs["Glyph Index"],
+            instance_on_points.inputs["Instance Index"],
+        )
+        links.new(
+            instance_on_points.outputs["Instances"], group_output.inputs["Geometry"]
+        )
+        group_input.location = (-400, 0)
+        collection_info.location = (-200, -200)
+        group_output.location = (200, 0)
+        return node_group
 
     @staticmethod
-    def get_empty_curve_object(collection_name: str = "tategaki_pool"):
-        collection = bpy.data.collections.get(collection_name)
-        if collection is None:
-            collection = bpy.data.collections.new(collection_name)
-        name = random_name(8)
-        data = bpy.data.curves.new(name, "CURVE")
-        obj = bpy.data.objects.new(name, data)
-        collection.objects.link(obj)
-        return obj
+    def find_layer_collection(layer_collection, name: str):
+        """view layerの中からコレクション名に対応するlayer collectionを探す"""
+        if layer_collection.name == name:
+            return layer_collection
+        for child in layer_collection.children:
+            found = TategakiTextUtil.find_layer_collection(child, name)
+            if found is not None:
+                return found
+        return None
+
+    @staticmethod
+    def remove_collection_recursive(collection: bpy.types.Collection):
+        """子コレクションごとコレクションを削除する（中のオブジェクトは削除しない）"""
+        for child in list(collection.children):
+            TategakiTextUtil.remove_collection_recursive(child)
+        bpy.data.collections.remove(collection)
+
+    @staticmethod
+    def copy_collection_recursive(
+        collection: bpy.types.Collection, name: str, copies: dict
+    ):
+        """
+        子コレクションごとコレクションと中のオブジェクトを複製する
+        オブジェクトのデータは複製しない copiesに元のオブジェクトから複製への対応を入れる
+        """
+        new_collection = bpy.data.collections.new(name)
+        for obj in collection.objects:
+            copy = copies.get(obj)
+            if copy is None:
+                copy = obj.copy()
+                trace.count("objects")
+                copies[obj] = copy
+            new_collection.objects.link(copy)
+        for child in collection.children:
+            child_name = child.name
+            if child_name.startswith(collection.name):
+                child_name = new_collection.name + child_name[len(collection.name) :]
+            new_collection.children.link(
+                TategakiTextUtil.copy_collection_recursive(child, child_name, copies)
+            )
+        return new_collection
+
+    def remove_tategaki_text(self, state: TategakiState) -> set:
+        """
+        縦書きテキストのコレクションの中身とコレクションを削除する
+        :return 削除したあとに使われなくなるかもしれないアドオンのデータ
+        """
+        collection = bpy.data.collections.get(state["name"])
+        deletion_objects = []
+        if collection is not None:
+            deletion_objects = list(collection.all_objects)
+        owned = self.collect_owned_data(deletion_objects, state)
+
+        del_obj: Object
+        for del_obj in deletion_objects:
+            del_obj.parent = None
+            bpy.data.objects.remove(del_obj)
+
+        if collection is not None:
+            self.remove_collection_recursive(collection)
+        return owned
+
+    @staticmethod
+    def collect_owned_data(objects: Objects, state: TategakiState = None) -> set:
+        """オブジェクトとstateが使っているデータのうちアドオンが作ったものを集める"""
+        owned = set()
+
+        def add(id_data):
+            if id_data is not None and id_data.get(OWNED):
+                owned.add(id_data)
+
+        for obj in objects:
+            add(obj.data)
+            for material in getattr(obj.data, "materials", []):
+                add(material)
+            for slot in obj.material_slots:
+                add(slot.material)
+            for modifier in obj.modifiers:
+                if modifier.type == "NODES":
+                    add(modifier.node_group)
+        if state is not None:
+            for material in state["materials"]:
+                add(material)
+        return owned
 
-    @timer
+    @staticmethod
+    def remove_unused_owned_data(owned: set) -> int:
+        """
+        アドオンが作ったデータのうち誰も使わなくなったものだけ削除する
+        他の縦書きテキストが使っている文字のデータやフェイクユーザーつきのものは残す
+        """
+        removed_count = 0
+        # 文字のデータを消すとマテリアルの使用数が減るので、消すものがなくなるまで繰り返す
+        while True:
+            unused = [id_data for id_data in owned if id_data.users == 0]
+            if len(unused) == 0:
+                break
+            owned = {id_data for id_data in owned if id_data.users != 0}
+            bpy.data.batch_remove(unused)
+            removed_count += len(unused)
+        logger.debug("removed %d data blocks", removed_count)
+        return removed_count
+
+    @traced
     def calc_kerning_hint(self, text_object: Object):
         """カーニング用の情報を計算する"""
         str_type = self.decision_special_character(text_object.data.body)
         if str_type == "rotation":
-            # text curveからメッシュへ変換してコピー
-            _converted_object = convert_to_mesh(text_object, parent_inheritance=False)
-            _temp_name = _converted_object.name
-            bpy.context.view_layer.update()
-            mesh_transform_apply(
-                _converted_object, location=False, rotation=True, world=False
-            )
-            bpy.context.view_layer.update()
-            bound_box_height = self.calc_bound_box_height(
-                bpy.data.objects[_temp_name].bound_box
-            )
-            bpy.data.objects.remove(bpy.data.objects[_temp_name])
+            # bound_boxはオブジェクトの回転前の座標なのでそこから回転後の高さを求める
+            bound_box_height = self.calc_rotated_bound_box_height(text_object.bound_box)
         elif str_type == "blank":
             bound_box_height = self.calc_bound_box_height(text_object.bound_box)
         else:
             bound_box_height = self.calc_bound_box_height(text_object.bound_box)
         return bound_box_height
 
+    @staticmethod
+    def get_registered_kerning_hint(data: TextCurve):
+        """
+        font.characterのTextCurveに登録してあるカーニングヒントを返す
+        フォントか細分化数が変わっていたらNone
+        """
+        registry = data.get(KERNING_HINT)
+        if registry is None:
+            return None
+        entry = registry.get(str(data.resolution_u))
+        if entry is None or data.font is None or entry["font"] != data.font.name:
+            return None
+        return BoundBoxHeight(max=entry["max"], min=entry["min"])
+
+    @staticmethod
+    def register_kerning_hint(data: TextCurve, hint: BoundBoxHeight):
+        """カーニングヒントをTextCurveに登録して、同じファイルの縦書きテキストで使いまわす"""
+        entry = {"font": data.font.name, "max": hint["max"], "min": hint["min"]}
+        registry = data.get(KERNING_HINT)
+        if registry is None:
+            data[KERNING_HINT] = {str(data.resolution_u): entry}
+        else:
+            registry[str(data.resolution_u)] = entry
+
+    def get_kerning_hints(self, names) -> dict[str, BoundBoxHeight]:
+        """font.characterの名前から登録してあるカーニングヒントを取り出す"""
+        hints = {}
+        for name in set(names):
+            data = bpy.data.curves.get(name)
+            hint = None if data is None else self.get_registered_kerning_hint(data)
+            if hint is not None:
+                hints[name] = hint
+        return hints
+
+    @traced
+    def calc_kerning_hints(self, objects: Objects) -> dict[str, BoundBoxHeight]:
+        """
+        font.characterごとのカーニングヒントをまとめて求めてTextCurveに登録する
+        登録済みの文字とディスクキャッシュにある文字は計算しない
+        """
+        hints: dict[str, BoundBoxHeight] = {}
+        unique: dict[str, Object] = {}
+        for obj in objects:
+            name = obj.data.name
+            if name in hints or name in unique:
+                continue
+            hint = self.get_registered_kerning_hint(obj.data)
+            if hint is None:
+                unique[name] = obj
+            else:
+                hints[name] = hint
+        registered_count = len(hints)
+
+        # フォントと細分化数ごとにまとめてキャッシュを引く
+        groups: dict[tuple, Objects] = {}
+        for obj in unique.values():
+            data: TextCurve = obj.data
+            try:
+                font = hint_cache.font_hash(data.font)
+            except OSError:
+                # フォントファイルが見つからないときはキャッシュを使わない
+                font = None
+            groups.setdefault((font, data.resolution_u), []).append(obj)
+
+        cache = hint_cache.get_cache()
+        missing: list[tuple[tuple, Object]] = []
+        with trace.span("hint_cache"):
+            for (font, resolution), group in groups.items():
+                cached = {}
+                if font is not None:
+                    characters = [obj.data.body for obj in group]
+                    cached = cache.get_many(font, characters, resolution)
+                for obj in group:
+                    hint = cached.get(obj.data.body)
+                    if hint is None:
+                        missing.append(((font, resolution), obj))
+                    else:
+                        hints[obj.data.name] = hint
+                        self.register_kerning_hint(obj.data, hint)
+
+        computed_count = len(missing)
+        if computed_count != 0:
+            self.ensure_evaluated()
+        computed: dict[tuple, dict[str, BoundBoxHeight]] = {}
+        with trace.span("kerning"):
+            for key, obj in missing:
+                hint = self.calc_kerning_hint(obj)
+                hints[obj.data.name] = hint
+                self.register_kerning_hint(obj.data, hint)
+                computed.setdefault(key, {})[obj.data.body] = hint
+        for (font, resolution), font_hints in computed.items():
+            if font is not None:
+                cache.set_many(font, font_hints, resolution)
+        logger.debug(
+            "kerning hints: %d, registered: %d, computed: %d",
+            len(hints),
+            registered_count,
+            computed_count,
+        )
+        return hints
+
+    def ensure_evaluated(self):
+        """bound_boxを読む前にupdateする オブジェクトを作ってから一度だけ"""
+        if not self.evaluated:
+            # bound_boxの更新が遅延するためupdateする
+            bpy.context.view_layer.update()
+            trace.count("view_layer.update")
+            self.evaluated = True
+
     """オブジェクト操作"""
 
-    def set_character_transform(
+    def calc_layout(
         self,
-        text_object: Object,
-        grid_addres: list[int],
-        character: str,
+        lines: list[list[tuple[str, str]]],
         state: TategakiState = None,
+        line_spacing: float = 0.0,
     ):
+        """
+        (font.character, 文字)の行ごとのリストから全文字の座標と回転をまとめて求める
+        line_spacingが0のときは行コンテナ基準の座標になる
+        """
         if state is None:
             state = self.state
-        """stateに基づいてテキストオブジェクトの位置回転を設定する"""
-        # フォーマット設定
-        mx, my = state["line_spacing"], state["chr_spacing"]
-        gx, gy = grid_addres
-        rotation = (0.0, 0.0, 0.0)
-        location = self.calc_grid_location(mx, my, gx, gy)
-        str_type = self.decision_special_character(character)
-        if str_type == "upper_right":
-            # bound_boxの更新が遅延するためupdateする
-            bpy.context.view_layer.update()
-            bound_box = text_object.bound_box
-            center = self.calc_bound_box_center_location(bound_box)
-            offset = self.calc_punctuation_offset(center)
-            location = mathutils.Vector(location) + mathutils.Vector(offset)
-        elif str_type == "rotation":
-            rotation = (0.0, 0.0, math.radians(-90))
-            # 回転設定
-            text_object.rotation_euler = rotation
-        # 座標設定
-        text_object.location = location
-
-    def apply_constant_kerning(self, text_line: Objects):
-        chr_spacing = self.state["chr_spacing"]
-        for chr_num, text_object in enumerate(text_line):
-            data: TextCurve = text_object.data
-            character = data.body
-            location = self.calc_grid_location(0, chr_spacing, 0, chr_num)
-            str_type = self.decision_special_character(character)
-            if str_type == "upper_right":
-                # bound_boxの更新が遅延するためupdateする
-                bpy.context.view_layer.update()
-                bound_box = text_object.bound_box
-                center = self.calc_bound_box_center_location(bound_box)
-                offset = self.calc_punctuation_offset(center)
-                location = mathutils.Vector(location) + mathutils.Vector(offset)
-            # 座標設定
-            text_object.location = location
-
-    def apply_auto_kerning(self, text_line: Objects):
-        """縦書き文字のカーニングをする"""
-        margin = self.state["chr_spacing"]
-        # 一つ前のオブジェクトの情報
-        forward_global_bound_bottom = 0.0
-
-        for i, text_object in enumerate(text_line):
-            # text_object: Object
-            # hintはfont.character形式で保存する
-            hint = self.state["kerning_hints"].get(text_object.data.name)
-            if hint is None:
-                logger.debug(f"{text_object.data.name} hint is None")
-                hint = self.calc_kerning_hint(text_object)
-                self.state["kerning_hints"].update({text_object.data.name: hint})
-
-            current_str_type = self.decision_special_character(text_object.data.body)
-
-            if current_str_type == "rotation":
-                local_current_bound_box_height = hint
-                local_current_bound_top = local_current_bound_box_height["max"]
-            elif current_str_type == "blank":
-                local_current_bound_box_height = hint
-                local_current_bound_top = self.state["blank_size"]
-            else:
-                local_current_bound_box_height = hint
-                local_current_bound_top = local_current_bound_box_height["max"]
-            # 今のオブジェクトのy座標（グローバル） マージンも反映する
-            if i == 0:
-                current_location_y = (
-                    forward_global_bound_bottom - local_current_bound_top
-                )
+        names = [name for line in lines for name, _character in line]
+        characters = [character for line in lines for _name, character in line]
+        line_numbers, chr_numbers = layout.grid_numbers([len(line) for line in lines])
+        str_types = layout.classify(characters)
+
+        hint_max = hint_min = None
+        if state["auto_kerning"]:
+            hints = self.get_kerning_hints(names)
+            hint_max = [hints[name]["max"] for name in names]
+            hint_min = [hints[name]["min"] for name in names]
+        offsets = state.get("punctuation_offsets", {})
+        zero = (0.0, 0.0, 0.0)
+        chr_offsets = [offsets.get(name, zero) for name in names]
+
+        return layout.calc_layout(
+            line_numbers,
+            chr_numbers,
+            str_types,
+            line_spacing,
+            state["chr_spacing"],
+            blank_size=state["blank_size"],
+            auto_kerning=state["auto_kerning"],
+            hint_max=hint_max,
+            hint_min=hint_min,
+            offsets=chr_offsets,
+        )
+
+    @traced
+    def update_punctuation_offsets(self, objects: Objects, state: TategakiState = None):
+        """
+        まだ求めていない句読点の位置オフセットをfont.characterごとに求める
+        求めたオフセットはTextCurveに保存して他の縦書きテキストでも使いまわす
+        """
+        if state is None:
+            state = self.state
+        offsets = dict(state.get("punctuation_offsets", {}))
+        missing: dict[str, Object] = {}
+        for obj in objects:
+            data: TextCurve = obj.data
+            if data.name in offsets or data.name in missing:
+                continue
+            if self.decision_special_character(data.body) != "upper_right":
+                continue
+            cached = data.get(PUNCTUATION_OFFSET)
+            if cached is not None and cached["resolution"] == data.resolution_u:
+                offsets[data.name] = list(cached["offset"])
             else:
-                current_location_y = (
-                    forward_global_bound_bottom - local_current_bound_top - margin
-                )
+                missing[data.name] = obj
+        if len(missing) != 0:
+            self.ensure_evaluated()
+            for name, obj in missing.items():
+                center = self.calc_bound_box_center_location(obj.bound_box)
+                offset = self.calc_punctuation_offset(center)
+                offsets[name] = offset
+                obj.data[PUNCTUATION_OFFSET] = {
+                    "resolution": obj.data.resolution_u,
+                    "offset": offset,
+                }
+        state["punctuation_offsets"] = offsets
+        return offsets
 
-            text_object.location[1] = current_location_y
-            current_bound_bottom = local_current_bound_box_height["min"]
-            forward_global_bound_bottom = current_bound_bottom + current_location_y
+    @staticmethod
+    def set_character_objects(objects: Objects, state: TategakiState):
+        """文字の並び順のオブジェクトをコンテナに保存する"""
+        refs = state["container"].tategaki_objects
+        refs.clear()
+        for obj in objects:
+            refs.add().object = obj
+
+    def get_character_objects(self, state: TategakiState = None) -> Objects:
+        """
+        文字の並び順のオブジェクトのリストを返す
+        コンテナに保存されていない(古いバージョンで作った)ときは作り直して保存する
+        """
+        if state is None:
+            state = self.state
+        count = sum(self.get_paragraph_lengths(state))
+        objects = [ref.object for ref in state["container"].tategaki_objects]
+        if len(objects) != count or None in objects:
+            objects = self.rebuild_character_objects(state)
+        return objects
+
+    def rebuild_character_objects(self, state: TategakiState) -> Objects:
+        """名前から文字の並び順のオブジェクトを探し直してコンテナに保存する"""
+        names = [
+            name for line in state.get("body_object_name_list", []) for name in line
+        ]
+        objects = [bpy.data.objects.get(name) for name in names]
+        count = len(state["text_props"])
+        if len(objects) != count or None in objects:
+            # 名前が変わっていたら行コンテナの子から名前順で拾う
+            objects = []
+            line_containers = state["line_containers"]
+            for key in sorted(line_containers, key=int):
+                line_container = bpy.data.objects.get(line_containers[key])
+                if line_container is None:
+                    continue
+                children = sorted(line_container.children, key=object_sort_function)
+                objects.extend(children)
+        logger.debug("rebuilt character objects: %d", len(objects))
+        self.set_character_objects(objects, state)
+        return objects
+
+    @staticmethod
+    def get_paragraph_lengths(state: TategakiState) -> list[int]:
+        """改行で分けた行ごとの文字数 保存してあるstateならtext_propsを復号しない"""
+        if isinstance(state, state_codec.LazyState) and not state.loaded("text_props"):
+            return state_codec.paragraph_lengths(state.group["text_props"])
+        return state["text_props"].paragraph_lengths()
+
+    def get_line_lengths(self, state: TategakiState = None) -> list[int]:
+        """行文字数制限で改行したあとの行ごとの文字数 CharacterArray.line_offsetsと同じ分け方"""
+        if state is None:
+            state = self.state
+        offsets = [0, *accumulate(self.get_paragraph_lengths(state))]
+        lines = characters.wrap_offsets(offsets, state["limit_length"])
+        return [end - start for start, end in zip(lines, lines[1:])]
+
+    def split_lines(self, objects: list, state: TategakiState = None) -> list[list]:
+        """文字の並び順のリストを行文字数制限で行ごとに分ける"""
+        lines = []
+        start = 0
+        for length in self.get_line_lengths(state):
+            lines.append(objects[start : start + length])
+            start += length
+        return lines
+
+    def get_line_containers(self, objects: Objects, state: TategakiState = None):
+        """行ごとの行コンテナ 文字がある行は文字の親から取る"""
+        if state is None:
+            state = self.state
+        line_containers = []
+        for i0, text_line in enumerate(self.split_lines(objects, state)):
+            if len(text_line) != 0 and text_line[0].parent is not None:
+                line_containers.append(text_line[0].parent)
+            else:
+                name = state["line_containers"].get(str(i0), "")
+                line_containers.append(bpy.data.objects.get(name))
+        return line_containers
 
     def get_line_container(self, index: int):
         state = self.state
@@ -430,22 +738,34 @@ class TategakiTextUtil:
         line_container.parent = container
         return line_container
 
-    @timer
-    def convert_text_object(self, text_object: Object):
+    @traced
+    def convert_text_object(
+        self,
+        text_object: Object,
+        backend: str = "OBJECTS",
+        limit_length: int = 20,
+        chr_spacing: float = 1.0,
+        line_spacing: float = 1.0,
+        auto_kerning: bool = False,
+        resolution: int = 2,
+    ):
         """テキストオブジェクトから縦書きテキストに変換する"""
         # コレクションの取得
         body = text_object.data.body
         # stateの初期化
         state = self.init_state(original=text_object)
         # テキストオブジェクトからプロパティを生成
-        text_props = self.text_to_props(text_object)
-        # 行文字数制限で改行する
-        mod_text_props = self.modify_text_props(text_props, limit_length=20)
+        with trace.span("props"):
+            text_props = self.text_to_props(text_object)
         state["body"] = body.splitlines()
         state["text_props"] = text_props
-        state["auto_kerning"] = False
+        state["auto_kerning"] = auto_kerning
         state["name"] = f"{text_object.name}.{state['tag']}"
-        state["limit_length"] = 20
+        state["limit_length"] = limit_length
+        state["chr_spacing"] = chr_spacing
+        state["line_spacing"] = line_spacing
+        state["backend"] = backend
+        state["resolution"] = resolution
         self.set_state(state)
         # apply
         # 改行済み文字propsがあるのでこれをよしなにする
@@ -453,12 +773,13 @@ class TategakiTextUtil:
         return container
 
     def generate_tategaki_text_from_state(self, state: TategakiState):
-        body_object_name_list = []
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            return self.generate_instanced_tategaki_text_from_state(state)
         line_containers = {}
         chr_count = 0
-        mod_text_props = self.modify_text_props(
-            state["text_props"], state["limit_length"]
-        )
+        with trace.span("props"):
+            chars: CharacterArray = state["text_props"]
+            line_ranges = chars.line_ranges(state["limit_length"])
         # コレクションの取得
         collection_name = state["name"]
         collection = self.get_collection(collection_name)
@@ -469,33 +790,289 @@ class TategakiTextUtil:
         container.name = collection_name
         state["container"] = container
         tag = state["tag"]
-        for i0, line in enumerate(mod_text_props):
-            line_names: list[str] = []
-            line_container = self.get_line_container(index=i0)
-            line_container.parent = container
-            line_containers.update({str(i0): line_container.name})
-            for i1, chr_prop in enumerate(line):
-                character = chr_prop["character"]
-                obj = self.character_prop_to_object(chr_prop)
-                self.set_character_transform(obj, [0, i1], character, state)
-                name = f"{tag}.{chr_count}.{character}"
-                obj.name = name
-                obj.parent = line_container
-                # コレクションにオブジェクトをリンクしないと表示されない
-                collection.objects.link(obj)
-                line_names.append(name)
-                chr_count += 1
-            body_object_name_list.append(line_names)
-        state["body_object_name_list"] = body_object_name_list
-        state["line_containers"] = line_containers
-        self.update_kerning_hint(state)
+        # シーンにリンク bound_boxを読むので先にリンクしておく
+        if bpy.context.scene.collection.children.get(collection.name) is None:
+            bpy.context.scene.collection.children.link(collection)
+
+        # 1. 全オブジェクトを作る
+        text_lines: list[Objects] = []
+        with trace.span("objects"):
+            for i0, (start, end) in enumerate(line_ranges):
+                text_line: Objects = []
+                line_container = self.get_line_container(index=i0)
+                line_container.parent = container
+                line_containers.update({str(i0): line_container.name})
+                for character, value in zip(
+                    chars.text[start:end], chars.formats[start:end]
+                ):
+                    obj = self.character_to_object(character, value)
+                    name = f"{tag}.{chr_count}.{character}"
+                    obj.name = name
+                    obj.parent = line_container
+                    # コレクションにオブジェクトをリンクしないと表示されない
+                    collection.objects.link(obj)
+                    text_line.append(obj)
+                    chr_count += 1
+                text_lines.append(text_line)
+            self.evaluated = False
+            state["line_containers"] = line_containers
+
+        # 2. updateは必要なときに一度だけしてヒントとオフセットをまとめて求める
+        with trace.span("hints"):
+            objects = [obj for text_line in text_lines for obj in text_line]
+            self.set_character_objects(objects, state)
+            if state["auto_kerning"]:
+                self.calc_kerning_hints(objects)
+            self.update_punctuation_offsets(objects, state)
+
+        # 3. まとめて配置する
+        with trace.span("layout"):
+            lines = [
+                [(obj.data.name, obj.data.body) for obj in text_line]
+                for text_line in text_lines
+            ]
+            locations, rotations = self.calc_layout(lines, state)
+            for obj, location, rotation in zip(
+                objects, locations.tolist(), rotations.tolist()
+            ):
+                obj.location = location
+                if rotation != 0.0:
+                    obj.rotation_euler = (0.0, 0.0, rotation)
         self.set_state(state)
+        self.save_state()
+        return container
+
+    def generate_instanced_tategaki_text_from_state(self, state: TategakiState):
+        """
+        文字ごとにオブジェクトを作らず、点群1つと重複しない文字オブジェクトから
+        geometry nodesのインスタンスで縦書きテキストを生成する
+        """
+        chars: CharacterArray = state["text_props"]
+        # コレクションの取得
+        collection = self.get_collection(state["name"])
+        collection_name = collection.name
+        # 点群をペアレントするエンプティの作成
+        container = self.get_empty(collection_name=collection_name)
+        container.location = bpy.context.scene.cursor.location
+        container.name = collection_name
+        state["container"] = container
+        tag = state["tag"]
+
+        # インスタンス元の文字オブジェクトを入れておくコレクション
+        glyph_collection = bpy.data.collections.new(f"{collection_name}.glyphs")
+        collection.children.link(glyph_collection)
+
+        # font.characterとマテリアルの組み合わせごとに1つだけ文字オブジェクトを作る
+        glyph_objects: dict[tuple[str, int], Object] = {}
+        glyph_keys: list[tuple[str, int]] = []
+        # 点の順番は折り返しても変わらないので段落を分けずに並べる
+        for character, value in zip(chars.text, chars.formats):
+            key = (
+                f"{self.get_font_name(value)}.{character}",
+                characters.material_index(value),
+            )
+            if key not in glyph_objects:
+                obj = self.character_to_object(character, value)
+                if self.decision_special_character(character) == "rotation":
+                    obj.rotation_euler = (0.0, 0.0, math.radians(-90))
+                glyph_collection.objects.link(obj)
+                glyph_objects[key] = obj
+            glyph_keys.append(key)
+
+        # Collection Infoは名前順に並ぶので連番の名前にしておく
+        glyph_index_map = {}
+        for i, (key, obj) in enumerate(glyph_objects.items()):
+            obj.name = f"{tag}.glyph.{i:05d}"
+            glyph_index_map[key] = i
+        glyph_index = [glyph_index_map[key] for key in glyph_keys]
+
+        # 1文字1頂点の点群を作る
+        mesh = bpy.data.meshes.new(f"{collection_name}.instances")
+        mesh[OWNED] = True
+        mesh.vertices.add(len(glyph_index))
+        attribute = mesh.attributes.new("glyph_index", "INT", "POINT")
+        attribute.data.foreach_set("value", glyph_index)
+        instancer = bpy.data.objects.new(mesh.name, mesh)
+        trace.count("objects")
+        collection.objects.link(instancer)
+        instancer.parent = container
+
+        modifier = instancer.modifiers.new("tategaki_instances", "NODES")
+        node_group = self.get_glyph_instancer_node_group()
+        modifier.node_group = node_group
+        glyphs_socket = node_group.inputs["Glyphs"].identifier
+        index_socket = node_group.inputs["Glyph Index"].identifier
+        modifier[glyphs_socket] = glyph_collection
+        modifier[f"{index_socket}_use_attribute"] = True
+        modifier[f"{index_socket}_attribute_name"] = "glyph_index"
+
+        state["instancer"] = instancer.name
+        state["glyph_collection"] = glyph_collection.name
+        state["line_containers"] = {}
+
         # シーンにリンク
         if bpy.context.scene.collection.children.get(collection.name) is None:
             bpy.context.scene.collection.children.link(collection)
+
+        # updateは必要なときに一度だけしてヒントとオフセットを計算する
+        self.evaluated = False
+        self.update_kerning_hint(state)
+        self.update_punctuation_offsets(list(glyph_objects.values()), state)
+
+        # インスタンス元がそのまま描画されないようにview layerから除外する
+        layer_collection = self.find_layer_collection(
+            bpy.context.view_layer.layer_collection, glyph_collection.name
+        )
+        if layer_collection is not None:
+            layer_collection.exclude = True
+
+        self.set_state(state)
+        self.update_instance_layout(state)
         self.save_state()
         return container
 
+    def measure_glyphs(self, glyphs: Objects, state: TategakiState = None):
+        """
+        INSTANCESの文字オブジェクトのカーニングヒントと句読点オフセットを求める
+        view layerから除外したままだとbound_boxが求まらないので一時的に戻す
+        """
+        if state is None:
+            state = self.state
+        layer_collection = self.find_layer_collection(
+            bpy.context.view_layer.layer_collection, state["glyph_collection"]
+        )
+        if layer_collection is not None:
+            layer_collection.exclude = False
+        self.evaluated = False
+        self.update_punctuation_offsets(glyphs, state)
+        self.calc_kerning_hints(glyphs)
+        if layer_collection is not None:
+            layer_collection.exclude = True
+
+    @traced
+    def copy_tategaki_text(self, state: TategakiState, tag: str) -> Object:
+        """
+        配置済みのオブジェクトをまとめて複製して新しいタグの縦書きテキストにする
+        文字の生成もカーニングヒントの計算もしない 文字のデータは元と共有する
+        """
+        old_tag = state["tag"]
+        old_collection = bpy.data.collections.get(state["name"])
+        if old_collection is None:
+            logger.info("collection '%s' is not found", state["name"])
+            raise KeyError(state["name"])
+        old_name = old_collection.name
+        orig_name = old_name.replace(f".{old_tag}", "")
+        copies: dict[Object, Object] = {}
+        collection = self.copy_collection_recursive(
+            old_collection, f"{orig_name}.{tag}", copies
+        )
+        collection_name = collection.name
+
+        # 親を複製に付け替えて、タグかコレクション名で始まる名前を新しいものにする
+        for old, copy in copies.items():
+            if old.parent in copies:
+                copy.parent = copies[old.parent]
+            if old.name.startswith(f"{old_tag}."):
+                copy.name = tag + old.name[len(old_tag) :]
+            elif old.name.startswith(old_name):
+                copy.name = collection_name + old.name[len(old_name) :]
+
+        # 文字の並び順の参照は元のオブジェクトを指しているので付け替える
+        container = copies[state["container"]]
+        for ref in container.tategaki_objects:
+            ref.object = copies.get(ref.object, ref.object)
+
+        if bpy.context.scene.collection.children.get(collection_name) is None:
+            bpy.context.scene.collection.children.link(collection)
+
+        # コピーしたstateは変わるフィールドだけ書き換える
+        new_state = self.load_object_state(container)
+        new_state["container"] = container
+        new_state["name"] = collection_name
+        new_state["tag"] = tag
+        line_containers = {}
+        for key, name in state["line_containers"].items():
+            line_container = copies.get(bpy.data.objects.get(name))
+            if line_container is not None:
+                line_containers[key] = line_container.name
+        new_state["line_containers"] = line_containers
+
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            # 点群は本文の更新で書き換えるのでメッシュも複製する
+            instancer = copies[bpy.data.objects[state["instancer"]]]
+            instancer.data = instancer.data.copy()
+            instancer.data.name = f"{collection_name}.instances"
+            glyph_collection = bpy.data.collections[
+                collection_name + state["glyph_collection"][len(old_name) :]
+            ]
+            modifier = instancer.modifiers["tategaki_instances"]
+            glyphs_socket = modifier.node_group.inputs["Glyphs"].identifier
+            modifier[glyphs_socket] = glyph_collection
+            new_state["instancer"] = instancer.name
+            new_state["glyph_collection"] = glyph_collection.name
+            layer_collection = self.find_layer_collection(
+                bpy.context.view_layer.layer_collection, glyph_collection.name
+            )
+            if layer_collection is not None:
+                layer_collection.exclude = True
+
+        self.set_state(new_state)
+        self.save_state()
+        logger.debug("copied %d objects", len(copies))
+        return container
+
+    def instance_tategaki_text(self, state: TategakiState) -> Object:
+        """
+        縦書きテキストのコレクションをインスタンスするエンプティを作る
+        置くだけならオブジェクトを複製しない 編集するときは実体化する
+        """
+        collection = bpy.data.collections.get(state["name"])
+        if collection is None:
+            logger.info("collection '%s' is not found", state["name"])
+            raise KeyError(state["name"])
+        # コンテナの位置をインスタンスの原点にする
+        # 原点はインスタンスで共有されるので、ほかにインスタンスがあるときは変えない
+        if len(collection.users_dupli_group) == 0:
+            collection.instance_offset = state["container"].matrix_world.translation
+        obj = bpy.data.objects.new(f"{collection.name}.instance", None)
+        obj.instance_type = "COLLECTION"
+        obj.instance_collection = collection
+        obj.empty_display_size = 0.5
+        bpy.context.scene.collection.objects.link(obj)
+        return obj
+
+    @traced
+    def update_instance_layout(self, state: TategakiState = None):
+        """INSTANCESのときの点群の座標をstateに合わせて書き換える"""
+        if state is None:
+            state = self.state
+        instancer = bpy.data.objects.get(state["instancer"])
+        if instancer is None:
+            logger.info("instancer '%s' is not found", state["instancer"])
+            return
+        if state["auto_kerning"]:
+            # 細分化数が変わったなどで登録されていない文字だけ測り直す
+            glyph_collection = bpy.data.collections.get(state["glyph_collection"])
+            missing = [
+                obj
+                for obj in glyph_collection.objects
+                if self.get_registered_kerning_hint(obj.data) is None
+            ]
+            if len(missing) != 0:
+                self.measure_glyphs(missing, state)
+        mesh: bpy.types.Mesh = instancer.data
+        chars: CharacterArray = state["text_props"]
+        glyphs = [
+            (f"{self.get_font_name(value)}.{character}", character)
+            for character, value in zip(chars.text, chars.formats)
+        ]
+        lines = [
+            glyphs[start:end] for start, end in chars.line_ranges(state["limit_length"])
+        ]
+        locations, _rotations = self.calc_layout(lines, state, state["line_spacing"])
+        mesh.vertices.foreach_set("co", locations.astype("float32").ravel())
+        mesh.update()
+
     """プロパティ操作"""
 
     def init_state(self, container: Object = None, original: Object = None):
@@ -512,19 +1089,18 @@ class TategakiTextUtil:
         materials = list(data.materials)
         if materials == []:
             mat = bpy.data.materials.new("Empty_Mat")
+            mat[OWNED] = True
             materials.append(mat)
 
         state = TategakiState(
             container=container,
             original=original,
-            name=random_name(8),
-            tag=random_name(8),
+            name=util.random_name(8),
+            tag=util.random_name(8),
             resolution=2,
             body=body,
-            text_props=[],
+            text_props=CharacterArray(),
             limit_length=80,
-            kerning_hints=dict(),
-            body_object_name_list=[],
             line_spacing=1.0,
             chr_spacing=1.0,
             blank_size=0.5,
@@ -535,6 +1111,10 @@ class TategakiTextUtil:
             font_bold=font_bold,
             font_italic=font_italic,
             font_bold_italic=font_bold_italic,
+            backend="OBJECTS",
+            instancer="",
+            glyph_collection="",
+            punctuation_offsets=dict(),
         )
 
         self.state = state
@@ -544,20 +1124,44 @@ class TategakiTextUtil:
         return self.state.copy()
 
     def set_state(self, state: TategakiState):
-        self.state = TategakiState(**state)
+        if isinstance(state, state_codec.LazyState):
+            # 読んでいないフィールドを復号しないようにそのまま使う
+            self.state = state
+        else:
+            self.state = TategakiState(**state)
 
+    @traced
     def save_state(self):
-        """オブジェクトにstateを保存する"""
-        state_dict = self.state.copy()
-        container = self.state["container"]
-        if TATEGAKI in container.keys():
-            container[TATEGAKI].update(state_dict)
+        """
+        オブジェクトにstateを保存する
+        保存済みのコンテナには読んだか書き換えたフィールドだけ書き込む
+        """
+        state = self.state
+        container = state["container"]
+        group = container.get(TATEGAKI)
+        if group is not None and state_codec.is_current(group):
+            for key, value in state.items():
+                value = state_codec.encode_field(key, value)
+                if value is not None:
+                    group[key] = value
         else:
-            container[TATEGAKI] = state_dict
+            if isinstance(state, state_codec.LazyState):
+                state.load_all()
+            container[TATEGAKI] = state_codec.encode_state(state)
 
     def load_object_state(self, obj: Object):
-        state = obj[TATEGAKI].to_dict()
-        self.set_state(state)
+        """保存してあるstateを読む フィールドは使うときに復号する"""
+        group = obj[TATEGAKI]
+        if not state_codec.is_current(group):
+            # 古いバージョンのstateは全部読んでから新しい形式で保存し直す
+            state = TategakiState(**group.to_dict())
+            state["text_props"] = CharacterArray.from_props(state["text_props"])
+            if state.get("backend", "OBJECTS") == "OBJECTS":
+                self.rebuild_character_objects(state)
+            state.pop("body_object_name_list", None)
+            obj[TATEGAKI] = state_codec.encode_state(state)
+            logger.info("migrated state of '%s'", obj.name)
+        self.set_state(state_codec.LazyState(obj[TATEGAKI]))
         return self.state
 
     def export_state(self, state):
@@ -569,204 +1173,588 @@ class TategakiTextUtil:
         )
         export.write(text)
 
-    @timer
+    @traced
     def update_lines_spacing(self, state: TategakiState = None):
         """stateに合わせて行間を更新する"""
         if state is None:
             state = self.state
-        line_spacing = self.state["line_spacing"]
-        lines = self.state["line_containers"]
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            self.update_instance_layout(state)
+            return
+        line_spacing = state["line_spacing"]
+        objects = self.get_character_objects(state)
         calc_grid_location = self.calc_grid_location
-        for key, name in lines.items():
-            line_number = int(key)
-            obj = bpy.data.objects.get(name)
+        for line_number, obj in enumerate(self.get_line_containers(objects, state)):
+            if obj is None:
+                continue
             loc = calc_grid_location(line_spacing, 0, line_number, 0)
             obj.location = loc
 
-    @timer
+    @traced
     def update_chr_spacing(self, state: TategakiState = None):
         """stateに合わせて字間を更新する"""
         if state is None:
             state = self.state
-        auto_kerning = self.state["auto_kerning"]
-        chr_spacing = self.state["chr_spacing"]
-        apply_auto_kerning = self.apply_auto_kerning
-        apply_constant_kerning = self.apply_constant_kerning
-        line_containers = self.state["line_containers"]
-        lci = line_containers.items()
-        if auto_kerning:
-            for _num, name in lci:
-                line_container = bpy.data.objects.get(name)
-                text_line = list(line_container.children)
-                text_line.sort(key=object_sort_function)
-                apply_auto_kerning(text_line)
-        else:
-            for _num, name in lci:
-                line_container = bpy.data.objects.get(name)
-                if line_container is None:
-                    continue
-                text_line = list(line_container.children)
-                text_line.sort(key=object_sort_function)
-                apply_constant_kerning(text_line)
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            self.update_instance_layout(state)
+            return
+        with trace.span("objects"):
+            objects = self.get_character_objects(state)
+            text_lines = self.split_lines(objects, state)
+
+        # 計算に必要な情報を揃えてからまとめて配置を求める
+        with trace.span("hints"):
+            self.update_punctuation_offsets(objects, state)
+            if state["auto_kerning"]:
+                # 登録済みのヒントは計算しない
+                self.calc_kerning_hints(objects)
+        with trace.span("layout"):
+            lines = [
+                [(obj.data.name, obj.data.body) for obj in text_line]
+                for text_line in text_lines
+            ]
+            locations, _rotations = self.calc_layout(lines, state)
+            for obj, location in zip(objects, locations.tolist()):
+                obj.location = location
 
-    @timer
+    @traced
     def update_limit_length(self, state: TategakiState = None):
         if state is None:
             state = self.state
-        # 参照しやすくする
-        tag = state["tag"]
-        limit_length = state["limit_length"]
-        text_props = state["text_props"]
-        line_containers = state["line_containers"]
-        line_containers2 = {}
-        collection = bpy.data.collections.get(state["name"])
-        mod_text_props = self.modify_text_props(text_props, limit_length)
-        chr_count = 0
-        for i0, line in enumerate(mod_text_props):
-            # 1行分のオブジェクトを取得
-            names = [
-                f"{tag}.{chr_count+i1}.{prop['character']}"
-                for i1, prop in enumerate(line)
-            ]
-            objects = [bpy.data.objects.get(name) for name in names]
-            chr_count += len(names)
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            # 点の並びは変わらないので座標を書き換えるだけ
+            self.update_instance_layout(state)
+            return
+        line_containers = {}
+        objects = self.get_character_objects(state)
+        for i0, text_line in enumerate(self.split_lines(objects, state)):
             # line_containerを取得　なかったら作成
             line_container = self.get_line_container(index=i0)
-            line_containers2.update({str(i0): line_container.name})
-
-            for i1, obj in enumerate(objects):
+            line_containers.update({str(i0): line_container.name})
+            for obj in text_line:
                 obj.parent = line_container
-        state["line_containers"] = line_containers2
-        # logger.debug(line_containers2)
-        # self.set_state(state)
+        state["line_containers"] = line_containers
 
-    @timer
+    @traced
     def update_kerning_hint(self, state: TategakiState = None):
         """stateに合わせてカーニングヒントを更新する"""
         if state is None:
             state = self.state
-        calc_kerning_hint = self.calc_kerning_hint
-        line_containers = state["line_containers"]
-        lci = line_containers.items()
-        kerning_hints = {}
-        for _num, name in lci:
-            line_container = bpy.data.objects.get(name)
-            text_line = list(line_container.children)
-            text_line.sort(key=object_sort_function)
-            # 行ごとのヒント情報を計算
-            line_hints = {obj.data.name: calc_kerning_hint(obj) for obj in text_line}
-            kerning_hints.update(line_hints)
-            # logger.debug(line_hints)
-        # logger.debug(kerning_hints)
-        state["kerning_hints"] = kerning_hints
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            glyph_collection = bpy.data.collections.get(state["glyph_collection"])
+            objects = list(glyph_collection.objects)
+        else:
+            objects = self.get_character_objects(state)
+        return self.calc_kerning_hints(objects)
+
+    @traced
+    def edit_body(self, text_object: Object):
+        """
+        テキストオブジェクトの本文と保存してあるpropsの差分だけ縦書きテキストに反映する
+        全部作り直さずに変わった文字だけ作成、削除、差し替えする
+        """
+        state = self.state
+        new_props = self.text_to_props(text_object)
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            self.edit_instanced_body(new_props, state)
+        else:
+            self.edit_object_body(new_props, state)
+        state["body"] = text_object.data.body.splitlines()
+        state["text_props"] = new_props
         self.set_state(state)
-        return kerning_hints
 
-    @timer
-    def freeze(self, context, resolution=2, freeze_type: str = "MESH"):
-        """縦書きテキストをメッシュまたはカーブに変換する"""
-
-        line_containers = self.state["line_containers"]
-        lci = line_containers.items()
+    def edit_object_body(self, new_props: CharacterArray, state: TategakiState):
+        """OBJECTSのときの本文の差分反映 変わった文字を含む行から後ろだけ配置し直す"""
+        tag = state["tag"]
+        old_tokens = state["text_props"].tokens()
+        new_tokens = new_props.tokens()
+        # トークンの位置から文字の番号への対応 改行は数えない
+        old_offsets = [0, *accumulate(int(t is not None) for t in old_tokens)]
+        new_offsets = [0, *accumulate(int(t is not None) for t in new_tokens)]
+        old_objects = self.get_character_objects(state)
+        if None in old_objects or len(old_objects) != old_offsets[-1]:
+            logger.info("some character objects are not found")
+            raise KeyError(state["name"])
+
+        collection = self.get_collection(state["name"])
         objects: Objects = []
-
-        # オブジェクトのリストを作成
-        for _num, container_name in lci:
-            line_container = bpy.data.objects.get(container_name)
-            text_line: Objects = list(line_container.children)
-            # childrenがNoneのときがあるので除外する
-            if len(text_line) == 0:
+        changed: Objects = []  # 作成したか差し替えたオブジェクト
+        removed: Objects = []
+        first_changed = None
+        matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            old_range = old_objects[old_offsets[i1] : old_offsets[i2]]
+            if op == "equal":
+                objects.extend(old_range)
                 continue
-            else:
-                objects.extend(text_line)
-
-        for obj in objects:
-            data: TextCurve = obj.data
-            data.resolution_u = resolution
+            if first_changed is None:
+                first_changed = len(objects)
+            new_start = new_offsets[j1]
+            new_end = new_offsets[j2]
+            new_range = zip(
+                new_props.text[new_start:new_end], new_props.formats[new_start:new_end]
+            )
+            # 置き換えた分はオブジェクトを使いまわして文字だけ差し替える
+            for i, (character, value) in enumerate(new_range):
+                if i < len(old_range):
+                    obj = old_range[i]
+                    self.apply_character(obj, character, value)
+                else:
+                    obj = self.character_to_object(character, value)
+                    collection.objects.link(obj)
+                objects.append(obj)
+                changed.append(obj)
+            removed.extend(old_range[new_end - new_start :])
+        if first_changed is None:
+            logger.debug("body is not changed")
+            return
+
+        for obj in removed:
+            bpy.data.objects.remove(obj)
+        # 後ろの文字の連番を振り直す 名前が衝突しないように一度仮の名前にしてから付ける
+        renamed = [
+            (i, obj)
+            for i, obj in enumerate(objects[first_changed:], first_changed)
+            if obj.name != f"{tag}.{i}.{obj.data.body}"
+        ]
+        for i, obj in renamed:
+            obj.name = f"{tag}.tmp.{i}"
+        for i, obj in renamed:
+            obj.name = f"{tag}.{i}.{obj.data.body}"
+
+        # 変わった文字を含む行から後ろだけ行コンテナを付け直す
+        line_lengths = [
+            end - start for start, end in new_props.line_ranges(state["limit_length"])
+        ]
+        starts = [0, *accumulate(line_lengths)]
+        first_line = bisect_left(starts, first_changed)
+        if starts[first_line] != first_changed:
+            first_line -= 1
+        old_line_containers = state["line_containers"]
+        line_containers = {}
+        text_lines: list[Objects] = []
+        for i0, length in enumerate(line_lengths):
+            text_line = objects[starts[i0] : starts[i0] + length]
+            if i0 < first_line:
+                line_containers[str(i0)] = old_line_containers[str(i0)]
+                continue
+            line_container = self.get_line_container(index=i0)
+            line_containers[str(i0)] = line_container.name
+            for obj in text_line:
+                obj.parent = line_container
+            text_lines.append(text_line)
+        # 行が減ったら余った行コンテナを消す
+        for key, name in old_line_containers.items():
+            line_container = bpy.data.objects.get(name)
+            if int(key) >= len(line_lengths) and line_container is not None:
+                bpy.data.objects.remove(line_container)
+        state["line_containers"] = line_containers
+        self.set_character_objects(objects, state)
+
+        # 新しい文字のヒントとオフセットだけ求めて配置する
+        self.evaluated = False
+        self.update_punctuation_offsets(changed, state)
+        relaid = [obj for text_line in text_lines for obj in text_line]
+        if state["auto_kerning"]:
+            self.calc_kerning_hints(relaid)
+        lines = [
+            [(obj.data.name, obj.data.body) for obj in text_line]
+            for text_line in text_lines
+        ]
+        locations, rotations = self.calc_layout(lines, state)
+        for obj, location, rotation in zip(
+            relaid, locations.tolist(), rotations.tolist()
+        ):
+            obj.location = location
+            obj.rotation_euler = (0.0, 0.0, rotation)
+        logger.debug(
+            "changed:%d, removed:%d, renamed:%d, relaid:%d",
+            len(changed),
+            len(removed),
+            len(renamed),
+            len(relaid),
+        )
 
-        # debug
-        # logger.debug(pprint.pformat(objects))
-        body_len = sum([len(s) for s in self.state["body"]])
-        objects_len = len(objects)
-        logger.info(f"body len:{body_len}, objects len:{objects_len}")
+    def edit_instanced_body(self, new_props: CharacterArray, state: TategakiState):
+        """
+        INSTANCESのときの本文の差分反映
+        足りない文字オブジェクトだけ作って、点群は配列で書き直す
+        """
+        tag = state["tag"]
+        glyph_collection = bpy.data.collections.get(state["glyph_collection"])
+        glyphs = sorted(glyph_collection.objects, key=object_sort_function)
+        material_keys = [mat.name for mat in state["materials"]]
+        glyph_index_map: dict[tuple[str, int], int] = {}
+        for i, obj in enumerate(glyphs):
+            material = obj.material_slots[0].material
+            material_index = 0
+            if material is not None and material.name in material_keys:
+                material_index = material_keys.index(material.name)
+            glyph_index_map.setdefault((obj.data.name, material_index), i)
+
+        new_glyphs: Objects = []
+        glyph_index = []
+        for character, value in zip(new_props.text, new_props.formats):
+            key = (
+                f"{self.get_font_name(value)}.{character}",
+                characters.material_index(value),
+            )
+            if key not in glyph_index_map:
+                obj = self.character_to_object(character, value)
+                if self.decision_special_character(character) == "rotation":
+                    obj.rotation_euler = (0.0, 0.0, math.radians(-90))
+                # Collection Infoの並び順に合わせて連番の続きにする
+                obj.name = f"{tag}.glyph.{len(glyphs) + len(new_glyphs):05d}"
+                glyph_collection.objects.link(obj)
+                glyph_index_map[key] = len(glyphs) + len(new_glyphs)
+                new_glyphs.append(obj)
+            glyph_index.append(glyph_index_map[key])
+
+        if len(new_glyphs) != 0:
+            self.measure_glyphs(new_glyphs, state)
+
+        instancer = bpy.data.objects.get(state["instancer"])
+        mesh: bpy.types.Mesh = instancer.data
+        if len(mesh.vertices) != len(glyph_index):
+            mesh.clear_geometry()
+            mesh.vertices.add(len(glyph_index))
+        attribute = mesh.attributes.get("glyph_index")
+        if attribute is None:
+            attribute = mesh.attributes.new("glyph_index", "INT", "POINT")
+        attribute.data.foreach_set("value", glyph_index)
+        state["text_props"] = new_props
+        self.update_instance_layout(state)
+        logger.debug("points:%d, new glyphs:%d", len(glyph_index), len(new_glyphs))
+
+    @traced
+    def warm_kerning_hint_cache(
+        self,
+        font: VectorFont,
+        characters: str,
+        resolution: int = 2,
+        chunk_size: int = 500,
+    ):
+        """
+        フォントの文字集合ぶんのカーニングヒントを計算してディスクキャッシュに保存する
+        :return 新しく計算した文字数
+        """
+        font_key = hint_cache.font_hash(font)
+        cache = hint_cache.get_cache()
+        cached = cache.get_many(font_key, characters, resolution)
+        missing = [c for c in dict.fromkeys(characters) if c not in cached]
+
+        collection = bpy.data.collections.new(f"tategaki_warm.{util.random_name(4)}")
+        bpy.context.scene.collection.children.link(collection)
+        try:
+            for i in range(0, len(missing), chunk_size):
+                objects: Objects = []
+                for character in missing[i : i + chunk_size]:
+                    data = bpy.data.curves.new(f"{collection.name}.{character}", "FONT")
+                    data.body = character
+                    data.align_y = "CENTER"
+                    data.align_x = "CENTER"
+                    data.font = font
+                    data.resolution_u = resolution
+                    obj = bpy.data.objects.new(data.name, data)
+                    collection.objects.link(obj)
+                    objects.append(obj)
+                # bound_boxを使うのでチャンクごとに一度だけupdateする
+                bpy.context.view_layer.update()
+                trace.count("view_layer.update")
+                hints = {obj.data.body: self.calc_kerning_hint(obj) for obj in objects}
+                cache.set_many(font_key, hints, resolution)
+                for obj in objects:
+                    data = obj.data
+                    bpy.data.objects.remove(obj)
+                    bpy.data.curves.remove(data)
+        finally:
+            bpy.data.collections.remove(collection)
+        return len(missing)
+
+    def get_glyph_placements(
+        self, state: TategakiState = None, resolution: int = None
+    ) -> "list[freeze.GlyphPlacement]":
+        """
+        freeze用に文字の配置をfont.characterごとにまとめる
+        行列はコンテナ基準、マテリアル番号はstateのmaterialsの番号
+        """
+        if state is None:
+            state = self.state
+        material_keys = [mat.name for mat in state["materials"]]
+        groups: dict[str, tuple[Object, list, list]] = {}
+
+        def add(obj: Object, matrix: mathutils.Matrix):
+            group = groups.setdefault(obj.data.name, (obj, [], []))
+            group[1].append(matrix)
+            material = obj.material_slots[0].material
+            if material is not None and material.name in material_keys:
+                group[2].append(material_keys.index(material.name))
+            else:
+                group[2].append(0)
+
+        if state.get("backend", "OBJECTS") == "INSTANCES":
+            instancer = bpy.data.objects.get(state["instancer"])
+            glyph_collection = bpy.data.collections.get(state["glyph_collection"])
+            glyphs = sorted(glyph_collection.objects, key=object_sort_function)
+            mesh: bpy.types.Mesh = instancer.data
+            count = len(mesh.vertices)
+            glyph_index = [0] * count
+            mesh.attributes["glyph_index"].data.foreach_get("value", glyph_index)
+            coords = [0.0] * (count * 3)
+            mesh.vertices.foreach_get("co", coords)
+            for i, index in enumerate(glyph_index):
+                glyph = glyphs[index]
+                translation = mathutils.Matrix.Translation(coords[i * 3 : i * 3 + 3])
+                add(glyph, translation @ glyph.matrix_basis)
+        else:
+            for obj in self.get_character_objects(state):
+                add(obj, obj.parent.matrix_basis @ obj.matrix_basis)
+
+        placements = []
+        for obj, matrices, material_indices in groups.values():
+            if resolution is not None:
+                data: TextCurve = obj.data
+                data.resolution_u = resolution
+            placements.append(freeze.make_placement(obj, matrices, material_indices))
+        return placements
+
+    def link_freeze_object(self, name: str, data, materials=True) -> Object:
+        """変換したデータのオブジェクトを作ってコンテナの位置に置く"""
+        state = self.state
+        if materials:
+            for mat in state["materials"]:
+                data.materials.append(mat)
+        obj = bpy.data.objects.new(name, data)
+        self.get_collection(state["name"]).objects.link(obj)
+        obj.parent = state["container"]
+        obj.location = state["container"].location
+        return obj
 
-        # freeze_typeに応じてカーブかメッシュに変換
+    def freeze_mesh(self, resolution=2) -> Object:
+        """
+        重複しない文字ごとに一度だけメッシュに変換して、配置ぶん並べた
+        1つのメッシュオブジェクトを作る 一時オブジェクトもオペレータも使わない
+        """
+        state = self.state
+        placements = self.get_glyph_placements(state, resolution)
+        logger.debug(
+            "glyphs:%d, characters:%d",
+            len(placements),
+            sum(len(p.matrices) for p in placements),
+        )
+        name = f"{state['name']}.freeze"
+        mesh = freeze.build_mesh(name, placements)
+        return self.link_freeze_object(name, mesh)
+
+    def freeze_curve(self, depsgraph, resolution=2) -> Object:
+        """
+        重複しない文字ごとに一度だけ輪郭のスプラインを取り出して、配置ぶん並べた
+        1つのカーブオブジェクトを作る 選択状態もオペレータも使わない
+        """
+        state = self.state
+        placements = self.get_glyph_placements(state, resolution)
+        logger.debug(
+            "glyphs:%d, characters:%d",
+            len(placements),
+            sum(len(p.matrices) for p in placements),
+        )
+        name = f"{state['name']}.freeze"
+        curve = freeze.build_curve(name, placements, depsgraph)
+        curve.resolution_u = resolution
+        curve.fill_mode = "FRONT"
+        return self.link_freeze_object(name, curve)
+
+    def freeze_gpencil(self, depsgraph, resolution=2) -> Object:
+        """
+        重複しない文字ごとに一度だけ輪郭(穴も含む)を塗りのストロークにして、
+        配置ぶん並べた1つのgpencilオブジェクトを作る
+        メッシュ化もモディファイアの適用もしない
+        """
+        state = self.state
+        placements = self.get_glyph_placements(state)
+        name = f"{state['name']}.freeze"
+        gpencil_data = freeze.build_gpencil(name, placements, depsgraph, resolution)
+        return self.link_freeze_object(name, gpencil_data, materials=False)
+
+    @traced
+    def freeze(self, context, resolution=2, freeze_type: str = "MESH", depsgraph=None):
+        """
+        縦書きテキストをメッシュ、カーブ、gpencilに変換する
+        まとめて変換するときはdepsgraphを渡すとコンテナごとに評価し直さずに済む
+        輪郭は制御点から取るので細分化数が変わっても同じdepsgraphを使える
+        """
         if freeze_type == "MESH":
+            return self.freeze_mesh(resolution)
+        if depsgraph is None:
+            depsgraph = context.evaluated_depsgraph_get()
+        if freeze_type == "CURVE":
+            return self.freeze_curve(depsgraph, resolution)
+        elif freeze_type == "GPENCIL":
+            return self.freeze_gpencil(depsgraph, resolution)
+        else:
+            logger.info(
+                "freeze_type='%s' is invalid. 'MESH', 'CURVE' or 'GPENCIL'", freeze_type
+            )
+            raise TypeError
 
-            converted_objects = [convert_to_mesh(obj) for obj in objects]
-            # 結合するときに都合がいいので空のメッシュオブジェクトを作る
-            empty_object = self.get_empty_mesh_object(self.state["name"])
-
-        elif freeze_type == "CURVE":
-
-            materials = self.state["materials"]
-            material_keys = [mat.name for mat in materials]
-
-            for obj in objects:
-                # コピーを作らないと重複文字がリンクデータなのでおかしくなる
-                obj.data = obj.data.copy()
-
-            bpy.ops.object.select_all(action="DESELECT")
-            object_names = [obj.name for obj in objects]
-
-            for obj in objects:
-                obj.select_set(True)
-
-            bpy.context.view_layer.objects.active = objects[0]
-            bpy.ops.object.convert(target="CURVE")
-            converted_objects = [bpy.data.objects.get(name) for name in object_names]
-
-            # マテリアルをよしなにする
-            for obj in converted_objects:
-                # マテリアルインデックスの交換対応表を作る
-                src_materials_keys = obj.material_slots.keys()
-                mat_exchage_index = [
-                    material_keys.index(keys) for keys in src_materials_keys
-                ]
-
-                # materialsを初期化
-                obj.data.materials.clear()
-                for mat in materials:
-                    obj.data.materials.append(mat)
-
-                # curveのマテリアルインデックスを対応表に応じて交換
-                for spline in obj.data.splines:
-                    src_index = spline.material_index
-                    spline.material_index = mat_exchage_index[src_index]
+    def get_footprint(self, state: TategakiState = None) -> dict:
+        """
+        縦書きテキストのオブジェクトとデータの数、stateの大きさ、
+        変換したメッシュなどのおおよそのメモリをまとめる
+        """
+        if state is None:
+            state = self.state
+        container = state["container"]
+        collection = bpy.data.collections.get(state["name"])
+        objects = [] if collection is None else list(collection.all_objects)
 
-            # 統合オブジェクトを作るときの位置調整用空カーブオブジェクトを作る
-            empty_object = self.get_empty_curve_object(self.state["name"])
+        # 文字のTextCurveごとにこの縦書きテキストの中で使っている数
+        local_users: dict[TextCurve, int] = {}
+        for obj in objects:
+            if obj.type == "FONT":
+                local_users[obj.data] = local_users.get(obj.data, 0) + 1
+        # ほかの縦書きテキストやオブジェクトも使っていれば共有
+        shared = sum(
+            data.users - int(data.use_fake_user) > users
+            for data, users in local_users.items()
+        )
+        kerning_hints = sum(
+            len(data.get(KERNING_HINT, {})) for data in local_users.keys()
+        )
+        punctuation_offsets = sum(
+            data.get(PUNCTUATION_OFFSET) is not None for data in local_users.keys()
+        )
 
-            for mat in materials:
-                empty_object.data.materials.append(mat)
+        state_count, state_bytes = footprint.idprop_size(container[TATEGAKI])
+        refs = len(container.tategaki_objects)
+        # 参照1つはグループとポインタのid-prop
+        refs_bytes = refs * 2 * footprint.IDPROP_HEADER_BYTES
+
+        frozen = [
+            {
+                "name": obj.name,
+                "type": obj.type,
+                "bytes": footprint.data_bytes(obj.data),
+            }
+            for obj in bpy.data.objects
+            if obj.name.startswith(f"{state['name']}.freeze")
+        ]
+        instancer = bpy.data.objects.get(state.get("instancer", ""))
+        return {
+            "container": container.name,
+            "backend": state.get("backend", "OBJECTS"),
+            "objects": len(objects),
+            "character_objects": sum(local_users.values()),
+            "line_containers": len(state["line_containers"]),
+            "text_curves": {"unique": len(local_users) - shared, "shared": shared},
+            "state": {"properties": state_count, "bytes": state_bytes},
+            "object_refs": {"count": refs, "bytes": refs_bytes},
+            "kerning_hints": kerning_hints,
+            "punctuation_offsets": punctuation_offsets,
+            "instancer_bytes": (
+                0 if instancer is None else footprint.data_bytes(instancer.data)
+            ),
+            "frozen": frozen,
+            "frozen_bytes": sum(entry["bytes"] for entry in frozen),
+        }
 
-        else:
-            logger.info(f"freeze_type='{freeze_type}' is invalid. 'MESH' or 'CURVE'")
-            raise TypeError
 
-        empty_object.parent = self.state["container"]
-        empty_object.name = f"{self.state['name']}.freeze"
-        joined_object_name = empty_object.name
-        converted_objects.append(empty_object)
+######### Operators ###########
 
-        # オーバーライドコンテキストを作る
-        override = context.copy()
-        override["selected_objects"] = converted_objects
-        override["selected_editable_objects"] = converted_objects
-        override["active_object"] = bpy.data.objects[joined_object_name]
-        bpy.ops.object.join(override)
+TARGET_ITEMS = [
+    ("ACTIVE", "Active", "Only the active vertical text"),
+    ("SELECTED", "Selected", "All selected vertical texts"),
+    ("COLLECTION", "Collection", "All vertical texts in the active collection"),
+]
 
-        location = self.state["container"].location
-        joint_object = bpy.data.objects[joined_object_name]
-        joint_object.location = location
 
-        if freeze_type == "CURVE":
-            _data: Curve = joint_object.data
-            _data.fill_mode = "FRONT"
-        return joint_object
+def target_property():
+    """対象の縦書きテキストを選ぶプロパティ"""
+    return bpy.props.EnumProperty(
+        name="target",
+        description="Vertical texts to apply to",
+        default="ACTIVE",
+        items=TARGET_ITEMS,
+    )
 
 
-######### Operators ###########
+def is_container(obj: Object):
+    return obj is not None and TATEGAKI in obj.keys()
+
+
+def has_containers(context: Context):
+    """アクティブか選択中のオブジェクトに縦書きテキストがあるか"""
+    if is_container(context.active_object):
+        return True
+    return any(is_container(obj) for obj in context.selected_objects)
+
+
+def get_target_containers(context: Context, target: str) -> Objects:
+    """targetに合わせて縦書きテキストのコンテナを集める"""
+    if target == "SELECTED":
+        objects = context.selected_objects
+    elif target == "COLLECTION":
+        objects = context.collection.all_objects
+    else:
+        objects = [context.active_object]
+    return [obj for obj in objects if is_container(obj)]
+
+
+def get_container_settings(container: Object) -> dict:
+    """メモリの確保の記録に残す縦書きテキストの設定"""
+    group = container[TATEGAKI]
+    if not state_codec.is_current(group):
+        # 古い形式のstateは実行中に変換される
+        return {"version": group.get(state_codec.VERSION_KEY)}
+    return {
+        "backend": group.get("backend", "OBJECTS"),
+        "characters": sum(state_codec.paragraph_lengths(group["text_props"])),
+        "limit_length": group.get("limit_length"),
+        "chr_spacing": group.get("chr_spacing"),
+        "line_spacing": group.get("line_spacing"),
+        "auto_kerning": bool(group.get("auto_kerning")),
+        "resolution": group.get("resolution"),
+    }
+
+
+def run_on_containers(
+    operator: bpy.types.Operator, context: Context, func, containers: Objects = None
+):
+    """
+    対象のコンテナごとにfunc(t_util, container)を実行して結果のリストを返す
+    utilを共有するのでupdateは全体で必要なときに一度だけになる
+    コンテナごとと全体の時間を通知する 対象がないときはNone
+    containersを省略するとoperator.targetから集める
+    """
+    if containers is None:
+        containers = get_target_containers(context, operator.target)
+    if len(containers) == 0:
+        operator.report({"WARNING"}, "No vertical text to apply to")
+        return None
+    t_util = TategakiTextUtil()
+    results = []
+    start = time.perf_counter()
+    for container in containers:
+        name = container.name  # removeで消えるので先に取っておく
+        label = f"{operator.bl_idname} {name}"
+        settings = None
+        if footprint.is_tracking():
+            settings = get_container_settings(container)
+        container_start = time.perf_counter()
+        with trace.span(label, "operator"), footprint.track_allocations(
+            label, settings
+        ):
+            results.append(func(t_util, container))
+        elapsed = time.perf_counter() - container_start
+        logger.info("%s %s: %.4fs", operator.bl_idname, name, elapsed)
+        operator.report({"INFO"}, f"{name}: {elapsed:.4f}s")
+    total = time.perf_counter() - start
+    operator.report(
+        {"INFO"},
+        f"execute {operator.bl_idname}. {len(containers)} vertical texts,"
+        f" total {total:.4f}s",
+    )
+    return results
 
 
 class TATEGAKI_OT_ConvertToTategakiText(bpy.types.Operator):
@@ -778,6 +1766,20 @@ class TATEGAKI_OT_ConvertToTategakiText(bpy.types.Operator):
 
     bl_options = {"REGISTER", "UNDO"}
 
+    backend: bpy.props.EnumProperty(
+        name="backend",
+        description="How to place the characters of vertical text",
+        default="OBJECTS",
+        items=[
+            ("OBJECTS", "Objects", "One object per character"),
+            (
+                "INSTANCES",
+                "Instances",
+                "One point cloud object that instances each character (Blender 3.0+)",
+            ),
+        ],
+    )
+
     @classmethod
     def poll(cls, context):
         if context.active_object.type == "FONT":
@@ -787,10 +1789,21 @@ class TATEGAKI_OT_ConvertToTategakiText(bpy.types.Operator):
 
     # メニューを実行したときに呼ばれるメソッド
     def execute(self, context):
+        if self.backend == "INSTANCES" and bpy.app.version < (3, 0, 0):
+            self.report({"ERROR"}, "Instances backend requires Blender 3.0 or later")
+            return {"CANCELLED"}
         t_util = TategakiTextUtil()
         text_object = context.active_object
-        container = t_util.convert_text_object(text_object)
+        settings = {
+            "backend": self.backend,
+            "characters": len(text_object.data.body),
+        }
+        with footprint.track_allocations(
+            f"{self.bl_idname} {text_object.name}", settings
+        ):
+            container = t_util.convert_text_object(text_object, backend=self.backend)
         bpy.ops.object.select_all(action="DESELECT")
+        trace.count("bpy.ops")
         container.select_set(True)
         context.view_layer.objects.active = container
         # infoにメッセージを通知
@@ -808,46 +1821,26 @@ class TATEGAKI_OT_Remove(bpy.types.Operator):
 
     bl_options = {"REGISTER", "UNDO"}
 
+    target: target_property()
+
     @classmethod
     def poll(cls, context):
-        if TATEGAKI in context.object.keys():
-            return True
-        else:
-            return False
+        return has_containers(context)
 
     # メニューを実行したときに呼ばれるメソッド
     def execute(self, context):
-        # setup
-        t_util = TategakiTextUtil()
-        tategaki_obj = context.object
-        state = t_util.load_object_state(tategaki_obj)
+        owned = set()
 
-        # 削除するオブジェクトを取得する
-        collection = bpy.data.collections.get(state["name"])
-        deletion_objects = []
-
-        if collection is None:
-            pass
-        else:
-            deletion_objects = list(collection.all_objects)
-
-        # removed = [o.name for o in deletion_objects]
+        def remove(t_util: TategakiTextUtil, tategaki_obj: Object):
+            state = t_util.load_object_state(tategaki_obj)
+            # 削除したあとに使われなくなるかもしれないデータを覚えておく
+            owned.update(t_util.remove_tategaki_text(state))
 
-        # 削除
-        del_obj: Object
-        for del_obj in deletion_objects:
-            del_obj.parent = None
-            bpy.data.objects.remove(del_obj)
-
-        bpy.data.collections.remove(collection)
-
-        # clean
-        bpy.ops.outliner.orphans_purge(
-            do_local_ids=True, do_linked_ids=True, do_recursive=True
-        )
+        if run_on_containers(self, context, remove) is None:
+            return {"CANCELLED"}
 
-        # infoにメッセージを通知
-        self.report({"INFO"}, f"execute {self.bl_idname}. removed tategaki object")
+        # clean 縦書きテキストが作ったデータだけ消す
+        TategakiTextUtil.remove_unused_owned_data(owned)
         # 正常終了ステータスを返す
         return {"FINISHED"}
 
@@ -860,49 +1853,187 @@ class TATEGAKI_OT_Duplicate(bpy.types.Operator):
     bl_description = "Duplicate the active vertical text object"
     bl_options = {"REGISTER", "UNDO"}
 
+    mode: bpy.props.EnumProperty(
+        name="mode",
+        description="How to duplicate the vertical text",
+        default="COPY",
+        items=[
+            (
+                "COPY",
+                "Copy",
+                "Copy the placed objects. Character data is shared with the source",
+            ),
+            (
+                "INSTANCE",
+                "Instance",
+                "Place a collection instance. Make it editable when needed",
+            ),
+            ("REGENERATE", "Regenerate", "Generate every character again"),
+        ],
+    )
+
+    target: target_property()
+
     @classmethod
     def poll(cls, context):
-        if TATEGAKI in context.active_object.keys():
-            return True
-        else:
-            return False
+        return has_containers(context)
 
     # メニューを実行したときに呼ばれるメソッド
     def execute(self, context):
-        # 初期化など
-        t_util = TategakiTextUtil()
-        obj = context.object
-        state = t_util.load_object_state(obj)
-        old_name = state["name"]
-        old_tag = state["tag"]
-        new_tag = random_name(8)
-        orig_name = old_name.replace(f".{old_tag}", "")
-        new_name = f"{orig_name}.{new_tag}"
+        def duplicate(t_util: TategakiTextUtil, obj: Object):
+            state = t_util.load_object_state(obj)
+            if self.mode != "REGENERATE":
+                return self.duplicate_placed(t_util, state)
+            old_name = state["name"]
+            old_tag = state["tag"]
+            new_tag = util.random_name(8)
+            orig_name = old_name.replace(f".{old_tag}", "")
+            new_name = f"{orig_name}.{new_tag}"
+
+            logger.debug(
+                "oname:%s,otag:%s,nname:%s,ntag%s", old_name, old_tag, new_name, new_tag
+            )
 
-        logger.debug(f"oname:{old_name},otag:{old_tag},nname:{new_name},ntag{new_tag}")
+            # 新しいタグと名前をつける
+            state["name"] = new_name
+            state["tag"] = new_tag
 
-        # 新しいタグと名前をつける
-        state["name"] = new_name
-        state["tag"] = new_tag
+            # 生成
+            t_util.set_state(state)
+            container = t_util.generate_tategaki_text_from_state(state)
 
-        # 生成
-        t_util.set_state(state)
-        container = t_util.generate_tategaki_text_from_state(state)
+            # 行間字間適応
+            t_util.update_chr_spacing()
+            t_util.update_lines_spacing()
+            return container
 
-        # 行間字間適応
-        t_util.update_chr_spacing()
-        t_util.update_lines_spacing()
+        containers = run_on_containers(self, context, duplicate)
+        if containers is None:
+            return {"CANCELLED"}
 
         # 選択状態を操作
         bpy.ops.object.select_all(action="DESELECT")
-        container.select_set(True)
-        context.view_layer.objects.active = container
+        trace.count("bpy.ops")
+        for container in containers:
+            container.select_set(True)
+        context.view_layer.objects.active = containers[-1]
 
-        # infoにメッセージを通知
-        self.report({"INFO"}, f"execute {self.bl_idname}")
         # 正常終了ステータスを返す
         return {"FINISHED"}
 
+    def duplicate_placed(self, t_util: TategakiTextUtil, state: TategakiState):
+        """作り直さずに配置済みのオブジェクトを複製するかインスタンスで置く"""
+        location = bpy.context.scene.cursor.location
+        if self.mode == "INSTANCE" and state.get("backend", "OBJECTS") == "OBJECTS":
+            obj = t_util.instance_tategaki_text(state)
+            obj.location = location
+            return obj
+        # INSTANCESは文字オブジェクトが少なくコレクションインスタンスにすると
+        # インスタンス元の文字も見えてしまうので複製する
+        container = t_util.copy_tategaki_text(state, util.random_name(8))
+        container.location = location
+        return container
+
+
+def get_instanced_container(obj: Object):
+    """縦書きテキストのコレクションをインスタンスしているエンプティならコンテナを返す"""
+    if obj is None or obj.instance_type != "COLLECTION":
+        return None
+    if obj.instance_collection is None:
+        return None
+    for child in obj.instance_collection.objects:
+        if is_container(child):
+            return child
+    return None
+
+
+class TATEGAKI_OT_MakeInstanceEditable(bpy.types.Operator):
+    """インスタンスで複製した縦書きテキストを編集できる縦書きテキストにする"""
+
+    bl_idname = "tategaki.make_instance_editable"
+    bl_label = "Make instance editable"
+    bl_description = (
+        "Replace instances of vertical text with independent editable vertical texts"
+    )
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        if get_instanced_container(context.active_object) is not None:
+            return True
+        return any(
+            get_instanced_container(obj) is not None for obj in context.selected_objects
+        )
+
+    def execute(self, context):
+        # 選択順を保ったまま重複を除き、アクティブを最後にして最後に作ったものをアクティブにする
+        objects = dict.fromkeys(context.selected_objects)
+        objects.pop(context.active_object, None)
+        objects[context.active_object] = None
+        instances = [obj for obj in objects if get_instanced_container(obj) is not None]
+        t_util = TategakiTextUtil()
+        containers = []
+        for instance in instances:
+            source = get_instanced_container(instance)
+            state = t_util.load_object_state(source)
+            container = t_util.copy_tategaki_text(state, util.random_name(8))
+            # インスタンスの原点からコンテナの位置を求める
+            offset = mathutils.Matrix.Translation(
+                -instance.instance_collection.instance_offset
+            )
+            container.matrix_world = (
+                instance.matrix_world @ offset @ source.matrix_world
+            )
+            bpy.data.objects.remove(instance)
+            containers.append(container)
+
+        bpy.ops.object.select_all(action="DESELECT")
+        trace.count("bpy.ops")
+        for container in containers:
+            container.select_set(True)
+        context.view_layer.objects.active = containers[-1]
+        self.report({"INFO"}, f"execute {self.bl_idname}")
+        return {"FINISHED"}
+
+
+class TATEGAKI_OT_UpdateBody(bpy.types.Operator):
+    """もとのテキストオブジェクトの本文の変更を縦書きテキストに反映する"""
+
+    bl_idname = "tategaki.update_body"
+    bl_label = "update body"
+    bl_description = "Apply edits of the original text object to the vertical text"
+    bl_options = {"REGISTER", "UNDO"}
+
+    target: target_property()
+
+    @classmethod
+    def poll(cls, context):
+        return has_containers(context)
+
+    def execute(self, context):
+        def update(t_util: TategakiTextUtil, obj: Object):
+            state = t_util.load_object_state(obj)
+            original = state.get("original")
+            if original is None or original.type != "FONT":
+                message = translation("The original text object is not found")
+                self.report({"ERROR"}, f"{obj.name}: {message}")
+                return False
+            try:
+                t_util.edit_body(original)
+            except KeyError:
+                message = translation(
+                    "Some character objects of vertical text are missing"
+                )
+                self.report({"ERROR"}, f"{obj.name}: {message}")
+                return False
+            t_util.save_state()
+            return True
+
+        results = run_on_containers(self, context, update)
+        if results is None or not any(results):
+            return {"CANCELLED"}
+        return {"FINISHED"}
+
 
 class TATEGAKI_OT_UpdateChrSpacing(bpy.types.Operator):
     """縦書きテキストの文字間隔と自動カーニングオプションを更新する"""
@@ -926,23 +2057,23 @@ class TATEGAKI_OT_UpdateChrSpacing(bpy.types.Operator):
         default=0.5,
     )
 
+    target: target_property()
+
     @classmethod
     def poll(cls, context):
-        if TATEGAKI in context.active_object.keys():
-            return True
-        else:
-            return False
+        return has_containers(context)
 
     def execute(self, context):
-        obj = context.object
-        t_util = TategakiTextUtil()
-        state = t_util.load_object_state(obj)
-        state["chr_spacing"] = self.chr_spacing
-        state["auto_kerning"] = self.auto_kerning
-        t_util.set_state(state)
-        t_util.update_chr_spacing()
-        t_util.save_state()  # 検証する
-
+        def update(t_util: TategakiTextUtil, obj: Object):
+            state = t_util.load_object_state(obj)
+            state["chr_spacing"] = self.chr_spacing
+            state["auto_kerning"] = self.auto_kerning
+            t_util.set_state(state)
+            t_util.update_chr_spacing()
+            t_util.save_state()  # 検証する
+
+        if run_on_containers(self, context, update) is None:
+            return {"CANCELLED"}
         return {"FINISHED"}
 
     def invoke(self, context: Context, event):
@@ -968,23 +2099,22 @@ class TATEGAKI_OT_UpdateLineSpacing(bpy.types.Operator):
         default=1,
     )
 
+    target: target_property()
+
     @classmethod
     def poll(cls, context):
-        if TATEGAKI in context.active_object.keys():
-            return True
-        else:
-            return False
+        return has_containers(context)
 
     def execute(self, context):
-
-        obj = context.object
-        t_util = TategakiTextUtil()
-        state = t_util.load_object_state(obj)
-        state["line_spacing"] = self.line_spacing
-        t_util.set_state(state)
-        t_util.update_lines_spacing()
-        t_util.save_state()  # 検証する
-
+        def update(t_util: TategakiTextUtil, obj: Object):
+            state = t_util.load_object_state(obj)
+            state["line_spacing"] = self.line_spacing
+            t_util.set_state(state)
+            t_util.update_lines_spacing()
+            t_util.save_state()  # 検証する
+
+        if run_on_containers(self, context, update) is None:
+            return {"CANCELLED"}
         return {"FINISHED"}
 
     def invoke(self, context: Context, event):
@@ -1013,23 +2143,23 @@ class TATEGAKI_OT_UpdateLineCharacterLimit(bpy.types.Operator):
         soft_max=100,
     )
 
+    target: target_property()
+
     @classmethod
     def poll(cls, context):
-        if TATEGAKI in context.active_object.keys():
-            return True
-        else:
-            return False
+        return has_containers(context)
 
     def execute(self, context):
-        obj = context.object
-        t_util = TategakiTextUtil()
-        state = t_util.load_object_state(obj)
-        state["limit_length"] = self.limit_length
-        t_util.set_state(state)
-        t_util.update_limit_length()
-        t_util.update_chr_spacing()
-        t_util.save_state()
-
+        def update(t_util: TategakiTextUtil, obj: Object):
+            state = t_util.load_object_state(obj)
+            state["limit_length"] = self.limit_length
+            t_util.set_state(state)
+            t_util.update_limit_length()
+            t_util.update_chr_spacing()
+            t_util.save_state()
+
+        if run_on_containers(self, context, update) is None:
+            return {"CANCELLED"}
         return {"FINISHED"}
 
     def invoke(self, context: Context, event):
@@ -1053,6 +2183,9 @@ class TATEGAKI_OT_Freeze(bpy.types.Operator):
 
     resolution: bpy.props.IntProperty(name="resolution", default=2)
 
+    # 文字ごとのメッシュのキャッシュを.npzでディスクにも保存する
+    disk_cache: bpy.props.BoolProperty(name="disk_cache", default=False)
+
     freeze_type: bpy.props.EnumProperty(
         name="freeze_type",
         default="MESH",
@@ -1063,111 +2196,302 @@ class TATEGAKI_OT_Freeze(bpy.types.Operator):
         ],
     )
 
+    target: target_property()
+
     @classmethod
     def poll(cls, context):
         try:
-            if TATEGAKI in context.active_object.keys():
-                return True
-            else:
-                return False
+            return has_containers(context)
         except:
             return False
 
     def execute(self, context: bpy.types.Context):
-        active_object: Object = context.active_object
         wm = context.window_manager
-        wm.progress_begin(0, 5)
+        containers = get_target_containers(context, self.target)
+        wm.progress_begin(0, len(containers))
+        glyph_cache.set_persistent(self.disk_cache)
+        progress = iter(range(1, len(containers) + 1))
+        # depsgraphで評価したデータを消さないように、元は全部変換してから削除する
+        states: list[TategakiState] = []
+        # depsgraphはコンテナごとに取り直さず、実行全体で1回だけ評価する
+        depsgraph = None
+        if self.freeze_type != "MESH" and len(containers) != 0:
+            depsgraph = context.evaluated_depsgraph_get()
+
+        def freeze(t_util: TategakiTextUtil, active_object: Object):
+            t_util.load_object_state(active_object)
+            location = active_object.location.copy()
+
+            freeze_type = self.freeze_type
+            obj = t_util.freeze(context, self.resolution, freeze_type, depsgraph)
 
-        if TATEGAKI in active_object.keys():
+            obj.name = f"{t_util.state['name']}.freeze"
+            obj.parent = None
+            collection = t_util.get_collection(t_util.state["name"])
 
+            # collectionにあったりなかったりするので分別
+            if collection.objects.get(obj.name) is not None:
+                collection.objects.unlink(obj)
+            if context.collection.objects.get(obj.name) is None:
+                context.scene.collection.objects.link(obj)
+            obj.location = location
+            states.append(t_util.state)
+            wm.progress_update(next(progress))
+            return obj
+
+        results = run_on_containers(self, context, freeze, containers)
+        if results is None:
+            wm.progress_end()
+            return {"CANCELLED"}
+        if self.keep_original is False:
+            # コレクションの中身と自身を削除
             t_util = TategakiTextUtil()
-            t_util.load_object_state(active_object)
-            location = active_object.location
+            owned = set()
+            for state in states:
+                owned.update(t_util.remove_tategaki_text(state))
+            TategakiTextUtil.remove_unused_owned_data(owned)
+        wm.progress_end()
+        return {"FINISHED"}
 
-            wm.progress_update(1)
 
-            freeze_type = self.freeze_type
-            if freeze_type == "GPENCIL":
-                # gpencilに変換する時に色々最適化する
-                obj = t_util.freeze(context, self.resolution, "MESH")
-                obj_name = obj.name
+class TATEGAKI_OT_WarmKerningHintCache(bpy.types.Operator):
+    """フォントの文字集合ぶんのカーニングヒントを計算してディスクキャッシュに保存する"""
 
-                wm.progress_update(2)
+    bl_idname = "tategaki.warm_kerning_hint_cache"
+    bl_label = "warm kerning hint cache"
+    bl_description = (
+        "Compute kerning hints of the font for a whole character set"
+        " and store them in the disk cache"
+    )
+    bl_options = {"REGISTER"}
 
-                obj.modifiers.clear()
+    charset: bpy.props.EnumProperty(
+        name="charset",
+        default="JIS_X_0208",
+        items=[
+            ("JIS_X_0208", "JIS X 0208", ""),
+            ("KANA", "Kana", ""),
+            ("ASCII", "ASCII", ""),
+        ],
+    )
 
-                decimate: DecimateModifier = obj.modifiers.new(
-                    name="gp_pre_decimate", type="DECIMATE"
-                )
-                decimate.decimate_type = "DISSOLVE"
-                decimate.angle_limit = math.radians(1)
+    resolution: bpy.props.IntProperty(name="resolution", default=2, min=1)
 
-                edge_split: EdgeSplitModifier = obj.modifiers.new(
-                    name="gp_pre_edge_split", type="EDGE_SPLIT"
-                )
-                edge_split.use_edge_angle = False
-                edge_split.use_edge_sharp = False
+    @classmethod
+    def poll(cls, context):
+        try:
+            if TATEGAKI in context.active_object.keys():
+                return True
+            if context.active_object.type == "FONT":
+                return True
+            return False
+        except AttributeError:
+            return False
 
-                _override = context.copy()
-                _override["object"] = obj
-                _override["active_object"] = obj
+    def execute(self, context):
+        obj = context.active_object
+        if TATEGAKI in obj.keys():
+            font = obj[TATEGAKI]["font"]
+        else:
+            font = obj.data.font
+        t_util = TategakiTextUtil()
+        characters = hint_cache.charset_characters(self.charset)
+        count = t_util.warm_kerning_hint_cache(font, characters, self.resolution)
+        self.report({"INFO"}, f"execute {self.bl_idname}. computed {count} hints")
+        return {"FINISHED"}
 
-                for mod in obj.modifiers:
-                    bpy.ops.object.modifier_apply(_override, modifier=mod.name)
+    def invoke(self, context: Context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self)
 
-                wm.progress_update(3)
 
-                # mesh_to_gpencil実装
-                gpencil_data = mesh_to_gpencil(obj.data)
-                obj = bpy.data.objects.new(obj_name, gpencil_data)
+class TATEGAKI_OT_Trace(bpy.types.Operator):
+    """処理時間の記録を始める 記録中なら止めてChromeのトレース形式で書き出す"""
 
-                wm.progress_update(4)
-            else:
-                obj = t_util.freeze(context, self.resolution, freeze_type)
-                wm.progress_update(4)
+    bl_idname = "tategaki.trace"
+    bl_label = "Start or stop tracing"
+    bl_description = (
+        "Start recording the time of each step."
+        " While recording, stop and write a Chrome trace JSON"
+    )
+    bl_options = {"REGISTER"}
 
-            obj.name = f"{t_util.state['name']}.freeze"
-            obj.parent = None
-            collection = t_util.get_collection(t_util.state["name"])
+    # 空のときはユーザー設定ディレクトリに日時の名前で書き出す
+    filepath: bpy.props.StringProperty(name="filepath", subtype="FILE_PATH")
 
-            # collectionにあったりなかったりするので分別
-            if obj in list(collection.objects):
-                collection.objects.unlink(obj)
-            if obj in list(context.collection.objects):
-                pass
-            else:
-                context.scene.collection.objects.link(obj)
-            obj.location = location
+    def execute(self, context):
+        if not trace.is_enabled():
+            trace.start()
+            self.report({"INFO"}, translation("Tracing started"))
+            return {"FINISHED"}
+        trace.stop()
+        path = bpy.path.abspath(self.filepath)
+        if path == "":
+            name = f"trace_{time.strftime('%Y%m%d_%H%M%S')}.json"
+            path = os.path.join(hint_cache.get_cache_dir(), name)
+        trace.export_chrome_trace(path)
+        self.report({"INFO"}, f"{translation('Wrote trace')}: {path}")
+        return {"FINISHED"}
 
-            if self.keep_original is False:
-                # コレクションの中身と自身を削除
-                all_objects = list(collection.all_objects)
 
-                for obj in all_objects:
-                    bpy.data.objects.remove(obj)
+# コンテナの名前 -> 最後に求めたフットプリント パネルに表示する
+footprint_reports: dict[str, dict] = {}
 
-                bpy.data.collections.remove(collection)
-                bpy.ops.outliner.orphans_purge(
-                    do_local_ids=True, do_linked_ids=True, do_recursive=True
-                )
 
-                wm.progress_update(5)
-                wm.progress_end()
+class TATEGAKI_OT_Footprint(bpy.types.Operator):
+    """縦書きテキストのオブジェクトとデータの数、stateの大きさ、メモリの目安を通知する"""
 
-                return {"FINISHED"}
-            else:
-                # keep_object Trueのときの処理を書こうと思ったけどめんどくさくなった
-                return {"FINISHED"}
+    bl_idname = "tategaki.footprint"
+    bl_label = "Report footprint"
+    bl_description = (
+        "Report the objects, data blocks, state size"
+        " and estimated memory of vertical texts"
+    )
+    bl_options = {"REGISTER"}
 
-        else:
-            # pollで弾くので普通は表示されない
-            self.report({"ERROR"}, f"active object is not tategaki-text-container")
-            return {"CANCELED"}
+    # 空でなければjsonで書き出す
+    filepath: bpy.props.StringProperty(name="filepath", subtype="FILE_PATH")
+
+    target: target_property()
+
+    @classmethod
+    def poll(cls, context):
+        try:
+            return has_containers(context)
+        except AttributeError:
+            return False
+
+    def execute(self, context):
+        containers = get_target_containers(context, self.target)
+        if len(containers) == 0:
+            self.report({"WARNING"}, "No vertical text to apply to")
+            return {"CANCELLED"}
+        t_util = TategakiTextUtil()
+        reports = []
+        for container in containers:
+            t_util.load_object_state(container)
+            report = t_util.get_footprint()
+            footprint_reports[container.name] = report
+            reports.append(report)
+            self.report(
+                {"INFO"},
+                f"{report['container']}: {report['objects']} objects,"
+                f" text curves {report['text_curves']['unique']} unique"
+                f" / {report['text_curves']['shared']} shared,"
+                f" state {footprint.format_bytes(report['state']['bytes'])},"
+                f" {report['kerning_hints']} kerning hints,"
+                f" frozen {footprint.format_bytes(report['frozen_bytes'])}",
+            )
+        path = bpy.path.abspath(self.filepath)
+        if path != "":
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(reports, f, indent=2)
+            self.report({"INFO"}, f"{translation('Wrote footprint')}: {path}")
+        return {"FINISHED"}
+
+
+class TATEGAKI_OT_TrackAllocations(bpy.types.Operator):
+    """
+    Python側のメモリの確保の記録を始める
+    記録中なら止めて、オペレーターごとの記録をjsonで書き出す
+    """
+
+    bl_idname = "tategaki.track_allocations"
+    bl_label = "Start or stop tracking allocations"
+    bl_description = (
+        "Record Python memory allocations of each vertical text"
+        " while operators run. While recording, stop and write the records as JSON"
+    )
+    bl_options = {"REGISTER"}
+
+    # 空のときはユーザー設定ディレクトリに日時の名前で書き出す
+    filepath: bpy.props.StringProperty(name="filepath", subtype="FILE_PATH")
+
+    def execute(self, context):
+        if not footprint.is_tracking():
+            footprint.start_tracking()
+            self.report({"INFO"}, translation("Allocation tracking started"))
+            return {"FINISHED"}
+        records = footprint.stop_tracking()
+        path = bpy.path.abspath(self.filepath)
+        if path == "":
+            name = f"allocations_{time.strftime('%Y%m%d_%H%M%S')}.json"
+            path = os.path.join(hint_cache.get_cache_dir(), name)
+        footprint.export_records(path)
+        # 残ったメモリの多い順に通知する
+        largest = sorted(records, key=lambda r: r["allocated"], reverse=True)
+        for record in largest[: footprint.TOP_COUNT]:
+            self.report({"INFO"}, footprint.format_record(record))
+        self.report({"INFO"}, f"{translation('Wrote allocations')}: {path}")
+        return {"FINISHED"}
 
 
 ######### UI ##########
 
 
+class TATEGAKI_PT_Footprint(bpy.types.Panel):
+    """アクティブな縦書きテキストのフットプリントとメモリの確保の記録"""
+
+    bl_label = "Tategaki Footprint"
+    bl_idname = "TATEGAKI_PT_Footprint"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "Tategaki"
+
+    @classmethod
+    def poll(cls, context):
+        return is_container(context.active_object)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.operator(TATEGAKI_OT_Footprint.bl_idname, icon="FILE_REFRESH")
+        report = footprint_reports.get(context.active_object.name)
+        if report is not None:
+            col = layout.column(align=True)
+            col.label(text=f"{translation('Objects')}: {report['objects']}")
+            col.label(
+                text=f"{translation('Character objects')}:"
+                f" {report['character_objects']}"
+            )
+            col.label(
+                text=f"{translation('Line containers')}: {report['line_containers']}"
+            )
+            col.label(
+                text=f"{translation('Text curves')}:"
+                f" {report['text_curves']['unique']} unique"
+                f" / {report['text_curves']['shared']} shared"
+            )
+            col.label(
+                text=f"{translation('State')}:"
+                f" {footprint.format_bytes(report['state']['bytes'])}"
+                f" ({report['state']['properties']} properties)"
+            )
+            col.label(text=f"{translation('Kerning hints')}: {report['kerning_hints']}")
+            col.label(
+                text=f"{translation('Frozen')}:"
+                f" {footprint.format_bytes(report['frozen_bytes'])}"
+                f" ({len(report['frozen'])} objects)"
+            )
+        layout.separator()
+        tracking = footprint.is_tracking()
+        layout.operator(
+            TATEGAKI_OT_TrackAllocations.bl_idname,
+            text=translation(
+                "Stop tracking allocations"
+                if tracking
+                else "Start tracking allocations"
+            ),
+            icon="PAUSE" if tracking else "REC",
+        )
+        col = layout.column(align=True)
+        for record in footprint.records()[-footprint.TOP_COUNT :]:
+            col.label(
+                text=f"{record['label']}:"
+                f" {footprint.format_bytes(record['allocated'])}"
+                f" (peak {footprint.format_bytes(record['peak'])})"
+            )
+
+
 class TATEGAKI_MT_Tools(bpy.types.Menu):
     """ツールの一覧メニュー"""
 
@@ -1183,6 +2507,8 @@ class TATEGAKI_MT_Tools(bpy.types.Menu):
                 return True
             if context.active_object.type == "FONT":
                 return True
+            if get_instanced_container(context.active_object) is not None:
+                return True
             return False
         except AttributeError:
             return False
@@ -1190,9 +2516,16 @@ class TATEGAKI_MT_Tools(bpy.types.Menu):
     def draw(self, context):
         layout = self.layout
         layout.operator(TATEGAKI_OT_ConvertToTategakiText.bl_idname)
+        op = layout.operator(
+            TATEGAKI_OT_ConvertToTategakiText.bl_idname,
+            text=translation("Convert to vertical text (instances)"),
+        )
+        op.backend = "INSTANCES"
         layout.operator(TATEGAKI_OT_Duplicate.bl_idname)
+        layout.operator(TATEGAKI_OT_MakeInstanceEditable.bl_idname)
         layout.operator(TATEGAKI_OT_Remove.bl_idname)
         layout.separator()
+        layout.operator(TATEGAKI_OT_UpdateBody.bl_idname)
         layout.operator(TATEGAKI_OT_UpdateChrSpacing.bl_idname)
         layout.operator(TATEGAKI_OT_UpdateLineSpacing.bl_idname)
         layout.operator(TATEGAKI_OT_UpdateLineCharacterLimit.bl_idname)
@@ -1200,6 +2533,13 @@ class TATEGAKI_MT_Tools(bpy.types.Menu):
         layout.operator_menu_enum(
             TATEGAKI_OT_Freeze.bl_idname, "freeze_type", text="Convert To"
         )
+        layout.separator()
+        layout.operator(TATEGAKI_OT_WarmKerningHintCache.bl_idname)
+        layout.operator(
+            TATEGAKI_OT_Trace.bl_idname,
+            text=translation("Stop tracing" if trace.is_enabled() else "Start tracing"),
+        )
+        layout.operator(TATEGAKI_OT_Footprint.bl_idname)
 
 
 def tategaki_menu(self, context):
@@ -1211,14 +2551,22 @@ def tategaki_menu(self, context):
 ######### registration ##########
 
 classses = [
+    TategakiObjectRef,
     TATEGAKI_MT_Tools,
     TATEGAKI_OT_ConvertToTategakiText,
+    TATEGAKI_OT_UpdateBody,
     TATEGAKI_OT_UpdateChrSpacing,
     TATEGAKI_OT_UpdateLineSpacing,
     TATEGAKI_OT_UpdateLineCharacterLimit,
     TATEGAKI_OT_Freeze,
     TATEGAKI_OT_Duplicate,
+    TATEGAKI_OT_MakeInstanceEditable,
     TATEGAKI_OT_Remove,
+    TATEGAKI_OT_WarmKerningHintCache,
+    TATEGAKI_OT_Trace,
+    TATEGAKI_OT_Footprint,
+    TATEGAKI_OT_TrackAllocations,
+    TATEGAKI_PT_Footprint,
 ]
 tools: list = []
 
@@ -1230,11 +2578,15 @@ def register():
     for t in tools:
         bpy.utils.register_tool(t)
 
+    # 縦書きテキストのコンテナに文字の並び順のオブジェクトを保存する
+    Object.tategaki_objects = bpy.props.CollectionProperty(type=TategakiObjectRef)
+
     bpy.types.VIEW3D_MT_object.append(tategaki_menu)
     bpy.types.VIEW3D_MT_object_context_menu.append(tategaki_menu)
 
 
 def unregister():
+    del Object.tategaki_objects
     for c in classses:
         bpy.utils.unregister_class(c)
     for t in tools:
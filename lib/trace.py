@@ -0,0 +1,179 @@
+# 処理時間を入れ子のスパンで記録するところ
+# 無効のときは何も記録しないので、スパンを入れたままでもほとんど遅くならない
+# 記録はChromeのトレース形式(chrome://tracing, Perfetto)のjsonで書き出せる
+#   with trace.span("objects"):
+#       ...
+#       trace.count("objects")
+import functools
+import json
+import os
+import threading
+import time
+from logging import getLogger, DEBUG
+
+logger = getLogger(__name__)
+
+_enabled = False
+_origin = 0  # 記録を始めたときのperf_counter_ns
+_events: list[dict] = []
+_counters: dict[str, int] = {}
+_stack: list[str] = []  # 今開いているスパンの名前
+_summary: dict[str, list] = {}  # スパンのパス -> [回数, 合計ns]
+
+
+class _NullSpan:
+    """無効のときに返すスパン 何もしない"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "category", "start", "counters")
+
+    def __init__(self, name: str, category: str):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        _stack.append(self.name)
+        self.counters = dict(_counters)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        path = "/".join(_stack)
+        _stack.pop()
+        duration = end - self.start
+        # スパンの間に増えたカウンタをargsに入れる
+        args = {
+            name: value - self.counters.get(name, 0)
+            for name, value in _counters.items()
+            if value != self.counters.get(name, 0)
+        }
+        _events.append(
+            {
+                "name": self.name,
+                "cat": self.category,
+                "ph": "X",
+                "ts": (self.start - _origin) / 1000,
+                "dur": duration / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+        entry = _summary.setdefault(path, [0, 0])
+        entry[0] += 1
+        entry[1] += duration
+        return False
+
+
+def span(name: str, category: str = "tategaki"):
+    """withで使うスパン 無効のときは何もしない"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category)
+
+
+def traced(func):
+    """関数全体をスパンにするデコレータ util.timerの代わり"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _Span(name, "function"):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def count(name: str, n: int = 1):
+    """カウンタを増やす 作ったオブジェクトの数、view_layer.update、bpy.opsの回数など"""
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def start():
+    """記録を始める 前の記録は消す"""
+    global _enabled, _origin
+    reset()
+    _origin = time.perf_counter_ns()
+    _enabled = True
+
+
+def stop():
+    """記録をやめる 記録は書き出すまで残る"""
+    global _enabled
+    _enabled = False
+    if logger.isEnabledFor(DEBUG):
+        logger.debug("trace summary\n%s", format_summary())
+
+
+def reset():
+    _events.clear()
+    _counters.clear()
+    _stack.clear()
+    _summary.clear()
+
+
+def counters() -> dict[str, int]:
+    return dict(_counters)
+
+
+def summary() -> dict[str, dict]:
+    """スパンのパスごとの回数と合計時間(ms)"""
+    return {
+        path: {"count": calls, "total_ms": total / 1e6}
+        for path, (calls, total) in _summary.items()
+    }
+
+
+def format_summary() -> str:
+    lines = [
+        f"{path}: {entry['total_ms']:.3f}ms x{entry['count']}"
+        for path, entry in sorted(summary().items())
+    ]
+    lines.extend(f"{name}: {value}" for name, value in sorted(_counters.items()))
+    return "\n".join(lines)
+
+
+def chrome_trace() -> dict:
+    """Chromeのトレース形式 カウンタは最後に合計を1つずつ入れる"""
+    now = (time.perf_counter_ns() - _origin) / 1000
+    counter_events = [
+        {
+            "name": name,
+            "ph": "C",
+            "ts": now,
+            "pid": os.getpid(),
+            "args": {"value": value},
+        }
+        for name, value in _counters.items()
+    ]
+    return {
+        "traceEvents": sorted(_events, key=lambda e: e["ts"]) + counter_events,
+        "displayTimeUnit": "ms",
+        "otherData": {"counters": counters(), "summary": summary()},
+    }
+
+
+def export_chrome_trace(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
+    logger.info("wrote trace: %s", path)
@@ -81,6 +81,246 @@ keys = [
         "key": "Deleting a vertical text object",
         "ja_JP": "縦書きテキストオブジェクトを削除する",
     },
+    {
+        "context": "*",
+        "key": "Convert to vertical text (instances)",
+        "ja_JP": "縦書きテキストに変換（インスタンス）",
+    },
+    {
+        "context": "*",
+        "key": "How to place the characters of vertical text",
+        "ja_JP": "縦書きテキストの文字の配置方法",
+    },
+    {
+        "context": "*",
+        "key": "One object per character",
+        "ja_JP": "1文字ごとに1オブジェクト",
+    },
+    {
+        "context": "*",
+        "key": "One point cloud object that instances each character (Blender 3.0+)",
+        "ja_JP": "点群オブジェクト1つで各文字をインスタンスする（Blender 3.0以降）",
+    },
+    {
+        "context": "Operator",
+        "key": "warm kerning hint cache",
+        "ja_JP": "カーニングヒントのキャッシュを作成",
+    },
+    {
+        "context": "*",
+        "key": "Compute kerning hints of the font for a whole character set"
+        " and store them in the disk cache",
+        "ja_JP": "フォントの文字集合ぶんのカーニングヒントを計算してディスクキャッシュに保存する",
+    },
+    {
+        "context": "Operator",
+        "key": "update body",
+        "ja_JP": "本文を更新",
+    },
+    {
+        "context": "*",
+        "key": "Apply edits of the original text object to the vertical text",
+        "ja_JP": "もとのテキストオブジェクトの本文の変更を縦書きテキストに反映する",
+    },
+    {
+        "context": "*",
+        "key": "The original text object is not found",
+        "ja_JP": "もとのテキストオブジェクトが見つかりません",
+    },
+    {
+        "context": "*",
+        "key": "Some character objects of vertical text are missing",
+        "ja_JP": "縦書きテキストの文字オブジェクトが見つかりません",
+    },
+    {
+        "context": "*",
+        "key": "Vertical texts to apply to",
+        "ja_JP": "適用する縦書きテキスト",
+    },
+    {
+        "context": "*",
+        "key": "Only the active vertical text",
+        "ja_JP": "アクティブな縦書きテキストだけ",
+    },
+    {
+        "context": "*",
+        "key": "All selected vertical texts",
+        "ja_JP": "選択中のすべての縦書きテキスト",
+    },
+    {
+        "context": "*",
+        "key": "All vertical texts in the active collection",
+        "ja_JP": "アクティブなコレクションのすべての縦書きテキスト",
+    },
+    {
+        "context": "*",
+        "key": "No vertical text to apply to",
+        "ja_JP": "適用する縦書きテキストがありません",
+    },
+    {
+        "context": "*",
+        "key": "How to duplicate the vertical text",
+        "ja_JP": "縦書きテキストの複製方法",
+    },
+    {
+        "context": "*",
+        "key": "Copy the placed objects. Character data is shared with the source",
+        "ja_JP": "配置済みのオブジェクトを複製する。文字のデータは複製元と共有する",
+    },
+    {
+        "context": "*",
+        "key": "Place a collection instance. Make it editable when needed",
+        "ja_JP": "コレクションインスタンスで置く。必要になったら編集できるようにする",
+    },
+    {
+        "context": "*",
+        "key": "Generate every character again",
+        "ja_JP": "すべての文字を生成し直す",
+    },
+    {
+        "context": "Operator",
+        "key": "Make instance editable",
+        "ja_JP": "インスタンスを編集可能にする",
+    },
+    {
+        "context": "*",
+        "key": "Replace instances of vertical text"
+        " with independent editable vertical texts",
+        "ja_JP": "縦書きテキストのインスタンスを独立した編集できる縦書きテキストに置き換える",
+    },
+    {
+        "context": "Operator",
+        "key": "Start or stop tracing",
+        "ja_JP": "処理時間の記録を開始/停止",
+    },
+    {
+        "context": "*",
+        "key": "Start recording the time of each step."
+        " While recording, stop and write a Chrome trace JSON",
+        "ja_JP": "処理ごとの時間の記録を始める。記録中なら止めてChromeのトレース形式のjsonを書き出す",
+    },
+    {
+        "context": "*",
+        "key": "Start tracing",
+        "ja_JP": "処理時間の記録を開始",
+    },
+    {
+        "context": "*",
+        "key": "Stop tracing",
+        "ja_JP": "処理時間の記録を停止して書き出す",
+    },
+    {
+        "context": "*",
+        "key": "Tracing started",
+        "ja_JP": "処理時間の記録を開始しました",
+    },
+    {
+        "context": "*",
+        "key": "Wrote trace",
+        "ja_JP": "処理時間の記録を書き出しました",
+    },
+    {
+        "context": "*",
+        "key": "log level",
+        "ja_JP": "ログのレベル",
+    },
+    {
+        "context": "*",
+        "key": "log to file",
+        "ja_JP": "ログをファイルに書く",
+    },
+    {
+        "context": "*",
+        "key": "Write logs to a file. When off, nothing is written to disk",
+        "ja_JP": "ログをファイルに書き出す。オフのときはディスクに何も書かない",
+    },
+    {
+        "context": "*",
+        "key": "log file",
+        "ja_JP": "ログファイル",
+    },
+    {
+        "context": "Operator",
+        "key": "Report footprint",
+        "ja_JP": "フットプリントを通知",
+    },
+    {
+        "context": "*",
+        "key": "Report the objects, data blocks, state size"
+        " and estimated memory of vertical texts",
+        "ja_JP": "縦書きテキストのオブジェクト、データブロック、stateの大きさ、メモリの目安を通知する",
+    },
+    {
+        "context": "*",
+        "key": "Wrote footprint",
+        "ja_JP": "フットプリントを書き出しました",
+    },
+    {
+        "context": "Operator",
+        "key": "Start or stop tracking allocations",
+        "ja_JP": "メモリの確保の記録を開始/停止",
+    },
+    {
+        "context": "*",
+        "key": "Record Python memory allocations of each vertical text"
+        " while operators run. While recording, stop and write the records as JSON",
+        "ja_JP": "オペレーターの実行中に縦書きテキストごとのPythonのメモリの確保を記録する。記録中なら止めてjsonで書き出す",
+    },
+    {
+        "context": "*",
+        "key": "Start tracking allocations",
+        "ja_JP": "メモリの確保の記録を開始",
+    },
+    {
+        "context": "*",
+        "key": "Stop tracking allocations",
+        "ja_JP": "メモリの確保の記録を停止して書き出す",
+    },
+    {
+        "context": "*",
+        "key": "Allocation tracking started",
+        "ja_JP": "メモリの確保の記録を開始しました",
+    },
+    {
+        "context": "*",
+        "key": "Wrote allocations",
+        "ja_JP": "メモリの確保の記録を書き出しました",
+    },
+    {
+        "context": "*",
+        "key": "Objects",
+        "ja_JP": "オブジェクト",
+    },
+    {
+        "context": "*",
+        "key": "Character objects",
+        "ja_JP": "文字のオブジェクト",
+    },
+    {
+        "context": "*",
+        "key": "Line containers",
+        "ja_JP": "行のコンテナ",
+    },
+    {
+        "context": "*",
+        "key": "Text curves",
+        "ja_JP": "文字のデータ",
+    },
+    {
+        "context": "*",
+        "key": "State",
+        "ja_JP": "状態",
+    },
+    {
+        "context": "*",
+        "key": "Kerning hints",
+        "ja_JP": "カーニングヒント",
+    },
+    {
+        "context": "*",
+        "key": "Frozen",
+        "ja_JP": "変換したデータ",
+    },
 ]
 
 
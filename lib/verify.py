@@ -1,10 +1,29 @@
 # 動作検証やパフォーマンスの検証をするコードをおいておくところ
+# ベンチマーク: blender -b -P <addon>/cli.py -- bench --output result.json
+# 起動だけ: blender -b -P <addon>/cli.py -- bench --startup-only
+import argparse
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
 import bpy
 from bpy.types import Object, TextCurve
-from .util import timer
+import numpy as np
+from .trace import traced
+from . import glyph_cache
+from . import hint_cache
+from . import layout
+from .tategaki import (
+    TategakiTextUtil,
+    KERNING_HINT,
+    PUNCTUATION_OFFSET,
+    OWNED,
+)
 
 
-@timer
+@traced
 def test_create_text_object(count: int = 100):
     """任意個のテキストオブジェクトを名前をつけて生成、テキストオブジェクトのリストを返す"""
     collection = bpy.context.scene.collection  # Master Collection
@@ -18,7 +37,7 @@ def test_create_text_object(count: int = 100):
     return objects
 
 
-@timer
+@traced
 def test_create_linked_text_object(count: int = 100):
     """
     任意個のテキストオブジェクトを名前をつけて生成、テキストオブジェクトのリストを返す
@@ -59,8 +78,342 @@ def get_chr_data(font_name: str, chr: str):
     return data
 
 
-@timer
+@traced
 def test_get_chr_data(count=100):
     """検索は結構速い"""
     li = [get_chr_data("Bfont", "A") for c in range(count)]
     pass
+
+
+# ベンチマーク
+
+SIZES = (100, 1000, 10000)
+CORPORA = ("kana", "punctuation")
+FREEZE_TYPES = ("MESH", "CURVE", "GPENCIL")
+PERCENTILES = (50, 90, 95)
+STARTUP_REPEAT = 5
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_MARKER = "TATEGAKI_STARTUP "
+# 新しいblenderでアドオンを有効にする時間と、最初のオペレーターで読み込む時間を測る
+# 有効にした時点でlazy_importしたモジュールが読み込まれていないかも調べる
+STARTUP_SCRIPT = """
+import importlib, json, sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+addon = importlib.import_module({name!r})
+addon.register()
+enable = time.perf_counter() - start
+lazy = importlib.import_module({name!r} + ".lib.lazy")
+tategaki = sys.modules[{name!r} + ".lib.tategaki"]
+names = ("util", "layout", "hint_cache", "freeze", "glyph_cache")
+loaded = [name for name in names if lazy.is_loaded(getattr(tategaki, name))]
+numpy = "numpy" in sys.modules
+start = time.perf_counter()
+for name in names:
+    getattr(tategaki, name).__dict__
+first_use = time.perf_counter() - start
+values = dict(enable=enable, first_use=first_use, loaded=loaded, numpy=numpy)
+print({marker!r} + json.dumps(values))
+"""
+
+HIRAGANA = "".join(chr(c) for c in range(0x3041, 0x3094))
+KATAKANA = "".join(chr(c) for c in range(0x30A1, 0x30F7))
+KANJI = "日本語縦書文字行間字間本文変換複製削除更新自動詰物語今日明私君彼話言見聞書読"
+PUNCTUATION = layout.UPPER_RIGHT_CHARACTERS[:2] + "「」『』（）ー…！？・"
+
+
+def make_corpus(kind: str, size: int, line_length: int = 40, seed: int = 0) -> str:
+    """
+    決まった乱数で本文を作る
+    kana: ほとんどかなと漢字 punctuation: 句読点や回転する括弧が多い
+    """
+    rng = random.Random(seed)
+    if kind == "kana":
+        pools = (HIRAGANA + KATAKANA, KANJI, PUNCTUATION)
+        weights = (0.8, 0.15, 0.05)
+    elif kind == "punctuation":
+        pools = (HIRAGANA + KATAKANA, KANJI, PUNCTUATION)
+        weights = (0.5, 0.1, 0.4)
+    else:
+        raise ValueError(f"corpus='{kind}' is invalid")
+    characters = [rng.choice(rng.choices(pools, weights)[0]) for _ in range(size)]
+    lines = [
+        "".join(characters[i : i + line_length]) for i in range(0, size, line_length)
+    ]
+    return "\n".join(lines)
+
+
+def make_text_object(body: str, font_path: str = None) -> Object:
+    if font_path is None:
+        font = bpy.data.fonts.load("<builtin>", check_existing=True)
+    else:
+        font = bpy.data.fonts.load(os.path.abspath(font_path), check_existing=True)
+    data = bpy.data.curves.new("bench", "FONT")
+    data.body = body
+    data.font = data.font_bold = data.font_italic = data.font_bold_italic = font
+    obj = bpy.data.objects.new(data.name, data)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def reset_caches():
+    """
+    毎回同じ条件で測るためにカーニングヒントと句読点オフセットとメッシュのキャッシュを消す
+    ディスクのヒントのキャッシュはベンチマーク用の一時ファイル
+    """
+    for data in bpy.data.curves:
+        if data.get(OWNED):
+            data.pop(KERNING_HINT, None)
+            data.pop(PUNCTUATION_OFFSET, None)
+    hint_cache.get_cache().clear()
+    glyph_cache.get_cache().clear()
+    glyph_cache.get_outline_cache().clear()
+
+
+def measure(func, repeat: int, setup=None) -> list[float]:
+    """funcをrepeat回実行して秒のリストを返す setupは測らない"""
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        func(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times: list[float]) -> dict:
+    values = np.array(times)
+    result = {"times": times, "min": values.min(), "max": values.max()}
+    for q in PERCENTILES:
+        result[f"p{q}"] = np.percentile(values, q)
+    result["median"] = result["p50"]
+    return {
+        key: value if key == "times" else float(value) for key, value in result.items()
+    }
+
+
+def bench_text(t_util: TategakiTextUtil, body: str, options) -> dict:
+    """1つの本文で各操作を測る {操作: 秒のリスト}"""
+    results = {}
+    text_object = make_text_object(body, options.font)
+    owned = set()
+
+    def convert(i):
+        t_util.convert_text_object(text_object, backend=options.backend)
+
+    def remove_previous(i):
+        if i != 0:
+            owned.update(t_util.remove_tategaki_text(t_util.state))
+            TategakiTextUtil.remove_unused_owned_data(owned)
+        reset_caches()
+
+    results["convert"] = measure(convert, options.repeat, remove_previous)
+    # 最後に作った縦書きテキストで更新を測る
+    state = t_util.state
+
+    def chr_spacing(i):
+        state["chr_spacing"] = 1.0 + 0.1 * (i % 2 + 1)
+        t_util.update_chr_spacing()
+
+    def line_spacing(i):
+        state["line_spacing"] = 1.0 + 0.1 * (i % 2 + 1)
+        t_util.update_lines_spacing()
+
+    def limit_length(i):
+        state["limit_length"] = 30 if i % 2 == 0 else 20
+        t_util.update_limit_length()
+        t_util.update_chr_spacing()
+
+    def auto_kerning(i):
+        t_util.update_chr_spacing()
+
+    def enable_auto_kerning(i):
+        state["auto_kerning"] = True
+        reset_caches()
+
+    results["chr_spacing"] = measure(chr_spacing, options.repeat)
+    results["line_spacing"] = measure(line_spacing, options.repeat)
+    results["limit_length"] = measure(limit_length, options.repeat)
+    results["auto_kerning"] = measure(auto_kerning, options.repeat, enable_auto_kerning)
+
+    for freeze_type in FREEZE_TYPES:
+        frozen = []
+
+        def freeze(i):
+            frozen.append(t_util.freeze(bpy.context, 2, freeze_type))
+
+        def remove_frozen(i):
+            for obj in frozen:
+                data = obj.data
+                bpy.data.objects.remove(obj)
+                bpy.data.batch_remove([data])
+            frozen.clear()
+            reset_caches()
+
+        results[f"freeze_{freeze_type}"] = measure(
+            freeze, options.repeat, remove_frozen
+        )
+        remove_frozen(0)
+
+    owned.update(t_util.remove_tategaki_text(state))
+    TategakiTextUtil.remove_unused_owned_data(owned)
+    data = text_object.data
+    bpy.data.objects.remove(text_object)
+    bpy.data.curves.remove(data)
+    return results
+
+
+def bench_startup(repeat: int) -> tuple[dict, dict]:
+    """
+    blender -b --factory-startupを毎回起動してアドオンを有効にする時間を測る
+    :return ({操作: 秒のリスト}, 有効にした時点で読み込まれていたもの)
+    """
+    script = STARTUP_SCRIPT.format(
+        path=os.path.dirname(ADDON_DIR),
+        name=os.path.basename(ADDON_DIR),
+        marker=STARTUP_MARKER,
+    )
+    command = [
+        bpy.app.binary_path,
+        "-b",
+        "--factory-startup",
+        "-noaudio",
+        "--python-expr",
+        script,
+    ]
+    results = {"enable": [], "first_use": [], "process": []}
+    loaded = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, text=True)
+        results["process"].append(time.perf_counter() - start)
+        lines = [
+            line[len(STARTUP_MARKER) :]
+            for line in process.stdout.splitlines()
+            if line.startswith(STARTUP_MARKER)
+        ]
+        if len(lines) == 0:
+            raise RuntimeError(f"startup benchmark failed:\n{process.stderr}")
+        values = json.loads(lines[-1])
+        results["enable"].append(values["enable"])
+        results["first_use"].append(values["first_use"])
+        loaded = {"modules": values["loaded"], "numpy": values["numpy"]}
+    return results, loaded
+
+
+def run_benchmark(options) -> dict:
+    """コーパスと文字数ごとに各操作を測ってまとめる"""
+    original_cache = hint_cache.get_cache()
+    glyph_cache.set_persistent(False)
+    cases = {}
+    startup = None
+    if options.startup_repeat != 0:
+        times, startup = bench_startup(options.startup_repeat)
+        for name, values in times.items():
+            cases[f"startup/{name}"] = summarize(values)
+            print(f"startup/{name}: {cases[f'startup/{name}']['median']:.4f}s")
+    corpora = [] if options.startup_only else options.corpora
+    with tempfile.TemporaryDirectory(prefix="tategaki_bench_") as directory:
+        cache = hint_cache.KerningHintCache(os.path.join(directory, "hints.sqlite3"))
+        hint_cache.set_cache(cache)
+        try:
+            for corpus in corpora:
+                for size in options.sizes:
+                    body = make_corpus(corpus, size)
+                    t_util = TategakiTextUtil()
+                    for name, times in bench_text(t_util, body, options).items():
+                        key = f"{corpus}/{size}/{name}"
+                        cases[key] = summarize(times)
+                        print(f"{key}: {cases[key]['median']:.4f}s")
+        finally:
+            cache.close()
+            hint_cache.set_cache(original_cache)
+    return {
+        "blender": bpy.app.version_string,
+        "backend": options.backend,
+        "font": options.font,
+        "repeat": options.repeat,
+        "startup": startup,
+        "cases": cases,
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float, min_delta: float):
+    """
+    中央値が基準よりthreshold(割合)より遅くなったケースを退行とする
+    min_delta秒より小さい差は誤差として扱う
+    """
+    comparison = {}
+    for key, case in result["cases"].items():
+        base = baseline["cases"].get(key)
+        if base is None:
+            continue
+        delta = case["median"] - base["median"]
+        ratio = case["median"] / base["median"] if base["median"] > 0 else 1.0
+        comparison[key] = {
+            "baseline": base["median"],
+            "median": case["median"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + threshold and delta > min_delta,
+        }
+    return comparison
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="blender -b -P cli.py -- bench",
+        description="Benchmark vertical text operations",
+    )
+    parser.add_argument("--output", help="json file to write the result")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", default="OBJECTS")
+    parser.add_argument("--font", help="font file (default: builtin font)")
+    parser.add_argument(
+        "--startup-repeat",
+        type=int,
+        default=STARTUP_REPEAT,
+        help="blender processes to measure the addon enable time (0: skip)",
+    )
+    parser.add_argument(
+        "--startup-only", action="store_true", help="measure only the enable time"
+    )
+    parser.add_argument("--result", help="compare this result instead of running")
+    parser.add_argument("--baseline", help="result json to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--min-delta", type=float, default=0.001, help="seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]) -> int:
+    """:return 基準と比べて退行したケースがあれば1"""
+    options = parse_args(argv)
+    if options.result is not None:
+        with open(options.result, encoding="utf-8") as f:
+            result = json.load(f)
+    else:
+        result = run_benchmark(options)
+
+    regressions = []
+    if options.baseline is not None:
+        with open(options.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare(result, baseline, options.threshold, options.min_delta)
+        result["comparison"] = comparison
+        for key, entry in comparison.items():
+            mark = "REGRESSION" if entry["regression"] else "ok"
+            print(
+                f"{key}: {entry['baseline']:.4f}s -> {entry['median']:.4f}s"
+                f" ({entry['ratio']:.2f}x) {mark}"
+            )
+            if entry["regression"]:
+                regressions.append(key)
+        print(f"{len(regressions)} regressions in {len(comparison)} cases")
+
+    if options.output is not None:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0 if len(regressions) == 0 else 1